@@ -0,0 +1,214 @@
+"""Margin analytics computed in SQL.
+
+Per-tender figures come from the tender_margins rollup; per-product figures
+aggregate order lines joined to their products. Unsplit time series read the
+day_margins rollup, one row per day; series split by client or product read
+the daily_margins rollup, one row per day, client and product.
+"""
+import math
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import List, Optional
+from sqlalchemy import case, func, type_coerce
+from sqlalchemy.orm import Session
+from database import Tender, Product, Order, TenderMargin, DailyMargin, DayMargin
+from money import Money, ZERO, to_decimal
+import schemas
+
+PERCENTILES = [0.25, 0.5, 0.75, 0.9, 0.95]
+TIMESERIES_FIELDS = ["order_count", "total_quantity", "total_margin", "total_revenue", "total_cost"]
+
+def date_filters(column, start_date: Optional[date], end_date: Optional[date]) -> list:
+    """Filters for an inclusive [start_date, end_date] range on a timestamp column"""
+    filters = []
+    if start_date is not None:
+        filters.append(column >= datetime.combine(start_date, time.min))
+    if end_date is not None:
+        filters.append(column < datetime.combine(end_date + timedelta(days=1), time.min))
+    return filters
+
+def _percentiles(db: Session, filters: list, count: int) -> dict:
+    """Continuous percentiles of the per-tender total margin"""
+    margin = TenderMargin.total_margin
+    if count == 0:
+        return {str(q): None for q in PERCENTILES}
+    
+    if db.get_bind().dialect.name == "postgresql":
+        row = (
+            db.query(*[type_coerce(func.percentile_cont(q).within_group(margin), Money) for q in PERCENTILES])
+            .join(Tender, Tender.id == TenderMargin.tender_id)
+            .filter(*filters)
+            .one()
+        )
+        return {str(q): value for q, value in zip(PERCENTILES, row)}
+    
+    # Without percentile_cont, read the two neighbouring ranks and interpolate
+    ordered = (
+        db.query(margin)
+        .join(Tender, Tender.id == TenderMargin.tender_id)
+        .filter(*filters)
+        .order_by(margin)
+    )
+    result = {}
+    for q in PERCENTILES:
+        position = q * (count - 1)
+        lower = math.floor(position)
+        values = [value for (value,) in ordered.offset(lower).limit(2)]
+        upper_value = values[1] if len(values) > 1 else values[0]
+        fraction = Decimal(str(position - lower))
+        result[str(q)] = to_decimal(values[0] + (upper_value - values[0]) * fraction)
+    return result
+
+def _tender_ranking(db: Session, filters: list, descending: bool, limit: int) -> List[schemas.TenderSummary]:
+    margin = TenderMargin.total_margin
+    rows = (
+        db.query(
+            Tender.id,
+            Tender.client,
+            Tender.award_date,
+            Tender.description,
+            TenderMargin.order_count.label("product_count"),
+            margin.label("total_margin"),
+        )
+        .join(TenderMargin, TenderMargin.tender_id == Tender.id)
+        .filter(*filters)
+        .order_by(margin.desc() if descending else margin, Tender.id)
+        .limit(limit)
+        .all()
+    )
+    return [schemas.TenderSummary(**row._asdict()) for row in rows]
+
+def get_margin_analytics(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                         top_n: int = 5, group_limit: int = 50) -> schemas.MarginAnalytics:
+    """Totals, distribution, percentiles and breakdowns of tender margins"""
+    filters = date_filters(Tender.award_date, start_date, end_date)
+    margin = TenderMargin.total_margin
+    
+    totals = (
+        db.query(
+            func.count(Tender.id).label("tender_count"),
+            func.coalesce(func.sum(TenderMargin.order_count), 0).label("product_count"),
+            func.coalesce(func.sum(margin), 0).label("total_margin"),
+            func.coalesce(func.sum(TenderMargin.total_revenue), 0).label("total_revenue"),
+            func.coalesce(func.sum(TenderMargin.total_cost), 0).label("total_cost"),
+            type_coerce(func.avg(margin), Money).label("average_margin"),
+            func.min(margin).label("min_margin"),
+            func.max(margin).label("max_margin"),
+            func.count(case((margin > 0, 1))).label("positive_count"),
+            func.count(case((margin < 0, 1))).label("negative_count"),
+            func.count(case((margin == 0, 1))).label("zero_count"),
+            func.coalesce(func.sum(case((margin > 0, margin), else_=0)), 0).label("positive_value"),
+            func.coalesce(func.sum(case((margin < 0, margin), else_=0)), 0).label("negative_value"),
+        )
+        .join(TenderMargin, TenderMargin.tender_id == Tender.id)
+        .filter(*filters)
+        .one()
+    )
+    
+    client_margin = func.sum(margin)
+    by_client = (
+        db.query(
+            Tender.client,
+            func.count(Tender.id).label("tender_count"),
+            client_margin.label("total_margin"),
+        )
+        .join(TenderMargin, TenderMargin.tender_id == Tender.id)
+        .filter(*filters)
+        .group_by(Tender.client)
+        .order_by(client_margin.desc())
+        .limit(group_limit)
+        .all()
+    )
+    
+    product_margin = func.sum((Product.unit_sale_price - Product.unit_cost) * Order.awarded_quantity)
+    by_product = (
+        db.query(
+            Product.id.label("product_id"),
+            Product.sku,
+            Product.name,
+            func.count(Order.id).label("order_count"),
+            func.sum(Order.awarded_quantity).label("total_quantity"),
+            product_margin.label("total_margin"),
+        )
+        .join(Order, Order.product_id == Product.id)
+        .join(Tender, Tender.id == Order.tender_id)
+        .filter(*filters)
+        .group_by(Product.id, Product.sku, Product.name)
+        .order_by(product_margin.desc())
+        .limit(group_limit)
+        .all()
+    )
+    
+    return schemas.MarginAnalytics(
+        start_date=start_date,
+        end_date=end_date,
+        tender_count=totals.tender_count,
+        product_count=totals.product_count,
+        total_margin=totals.total_margin,
+        total_revenue=totals.total_revenue,
+        total_cost=totals.total_cost,
+        average_margin=totals.average_margin or ZERO,
+        min_margin=totals.min_margin,
+        max_margin=totals.max_margin,
+        distribution=schemas.MarginDistribution(
+            positive=totals.positive_count,
+            negative=totals.negative_count,
+            zero=totals.zero_count,
+            positive_value=totals.positive_value,
+            negative_value=totals.negative_value,
+        ),
+        percentiles=_percentiles(db, filters, totals.tender_count),
+        top_tenders=_tender_ranking(db, filters, descending=True, limit=top_n),
+        worst_tenders=_tender_ranking(db, filters, descending=False, limit=top_n),
+        by_client=[schemas.ClientMargin(**row._asdict()) for row in by_client],
+        by_product=[schemas.ProductMargin(**row._asdict()) for row in by_product],
+    )
+
+def _bucket_start(day: date, bucket: str) -> date:
+    """First day of the day/week/month bucket containing day (weeks start on Monday)"""
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+def get_margin_timeseries(db: Session, bucket: str = "day", split: Optional[str] = None,
+                          start_date: Optional[date] = None, end_date: Optional[date] = None) -> schemas.MarginTimeSeries:
+    """Margin, revenue and order totals per day/week/month, optionally split by client or product"""
+    # The unsplit series reads one day_margins row per day; splits need the
+    # (day, client, product) rows of daily_margins
+    rollup = DailyMargin if split else DayMargin
+    columns = [rollup.day]
+    if split == "client":
+        columns.append(DailyMargin.client.label("key"))
+    elif split == "product":
+        columns.append(Product.sku.label("key"))
+    
+    query = db.query(*columns, *[func.sum(getattr(rollup, field)).label(field) for field in TIMESERIES_FIELDS])
+    if split == "product":
+        query = query.join(Product, Product.id == DailyMargin.product_id)
+    if start_date is not None:
+        query = query.filter(rollup.day >= start_date)
+    if end_date is not None:
+        query = query.filter(rollup.day <= end_date)
+    rows = query.group_by(*columns).all()
+    
+    # SQL collapses the rollup to one row per day (and key); weeks and months fold here
+    points = {}
+    for row in rows:
+        key = row.key if split else None
+        period = (_bucket_start(row.day, bucket), key)
+        point = points.setdefault(period, dict.fromkeys(TIMESERIES_FIELDS, 0))
+        for field in TIMESERIES_FIELDS:
+            point[field] += getattr(row, field)
+    
+    return schemas.MarginTimeSeries(
+        bucket=bucket,
+        split=split,
+        start_date=start_date,
+        end_date=end_date,
+        points=[
+            schemas.TimeSeriesPoint(period=period, key=key, **points[(period, key)])
+            for period, key in sorted(points, key=lambda item: (item[0], item[1] or ""))
+        ],
+    )
@@ -0,0 +1,331 @@
+"""Load and regression benchmark for every API endpoint.
+
+Fills a scratch database with deterministic synthetic data at one of the
+SIZES presets, starts a uvicorn worker against it and drives each endpoint at
+every concurrency level. For each (endpoint, concurrency) pair it records
+p50/p95/p99 latency, throughput, errors and SQL statements per request (read
+from the ``Server-Timing`` header). Results are written as JSON; pass a
+previous results file to ``--compare`` to fail on regressions between commits.
+
+SQLite is used by default; set ``BENCH_DATABASE_URL`` to a local PostgreSQL
+database (its tables are dropped and recreated) to benchmark against that.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_api --size 100k --concurrency 1,8,32 --output bench-api.json
+    python -m benchmarks.bench_api --size 100k --compare bench-api.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.common import make_engine, make_session, populate, timed, wait_until_ready
+from pagination import encode_cursor
+
+# (tenders, products, orders per tender) for each preset; the name is the order count
+SIZES = {
+    "1k": (100, 100, 10),
+    "100k": (10_000, 2_000, 10),
+    "1M": (100_000, 10_000, 10),
+}
+
+# Streaming exports read whole tables, so they get this share of the requests
+EXPORT_SHARE = 0.05
+
+class Scenario:
+    """One endpoint call; ``setup`` runs untimed before each request"""
+
+    def __init__(self, name, method, path, body=None, setup=None, export=False, expect=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.setup = setup
+        self.export = export
+        self.expect = expect or {200}
+
+def scenarios(tenders: int, products: int, orders: int):
+    """Every endpoint in main.py except /seed-database/, which calls the external feeds"""
+    tender = lambda rng: rng.randint(1, tenders)
+    product = lambda rng: rng.randint(1, products)
+    order = lambda rng: rng.randint(1, orders)
+    sku = lambda rng: f"SKU-{rng.randint(1, products):07d}"
+
+    async def create_tender(client, rng):
+        response = await client.post("/tenders/", json={"client": "Bench delete", "description": None})
+        return response.json()["id"]
+
+    async def create_product(client, rng):
+        suffix = rng.getrandbits(48)
+        response = await client.post("/products/", json={
+            "name": "Bench delete", "sku": f"DEL-{suffix:012x}", "unit_sale_price": 20, "unit_cost": 10,
+        })
+        return response.json()["id"]
+
+    async def create_order(client, rng):
+        response = await client.post("/orders/", json={
+            "tender_id": rng.randint(1, tenders), "product_id": rng.randint(1, products), "awarded_quantity": 1,
+        })
+        return response.json()["id"]
+
+    return [
+        # Reads first, so the writes below do not change what they measure
+        Scenario("health", "GET", lambda rng, state: "/health"),
+        Scenario("ready", "GET", lambda rng, state: "/ready"),
+        Scenario("tenders.list", "GET", lambda rng, state: "/tenders/?limit=50"),
+        Scenario("tenders.list.cursor", "GET", lambda rng, state: f"/tenders/?limit=50&after={encode_cursor(tender(rng))}"),
+        Scenario("tenders.detail", "GET", lambda rng, state: f"/tenders/{tender(rng)}"),
+        Scenario("tenders.details.batch", "GET",
+                 lambda rng, state: "/tenders/details?ids=" + ",".join(str(tender(rng)) for _ in range(10))),
+        Scenario("tenders.validate", "GET", lambda rng, state: f"/tenders/{tender(rng)}/validate"),
+        Scenario("products.list", "GET", lambda rng, state: "/products/?limit=50"),
+        Scenario("products.detail", "GET", lambda rng, state: f"/products/{product(rng)}"),
+        Scenario("orders.list", "GET", lambda rng, state: "/orders/?limit=50"),
+        Scenario("orders.detail", "GET", lambda rng, state: f"/orders/{order(rng)}"),
+        Scenario("analytics.margins", "GET", lambda rng, state: "/analytics/margins"),
+        Scenario("analytics.timeseries", "GET", lambda rng, state: "/analytics/margins/timeseries?bucket=month&split=client"),
+        Scenario("search.tenders", "GET", lambda rng, state: f"/search/tenders?q=client%20{rng.randint(0, 96)}"),
+        Scenario("search.products", "GET", lambda rng, state: f"/search/products?q=sku-{rng.randint(1, products):07d}"[:-2]),
+        Scenario("simulate.margins", "POST", lambda rng, state: "/simulate/margins",
+                 body=lambda rng, state: {"changes": [{"sku": sku(rng), "cost_change_pct": 5} for _ in range(10)], "limit": 50}),
+        Scenario("tenders.export", "GET", lambda rng, state: "/tenders/export?format=ndjson", export=True),
+        Scenario("orders.export", "GET", lambda rng, state: "/orders/export?format=csv", export=True),
+        Scenario("health.pool", "GET", lambda rng, state: "/health/pool"),
+        Scenario("health.cache", "GET", lambda rng, state: "/health/cache"),
+        Scenario("health.requests", "GET", lambda rng, state: "/health/requests"),
+        Scenario("metrics", "GET", lambda rng, state: "/metrics"),
+        # Writes
+        Scenario("tenders.create", "POST", lambda rng, state: "/tenders/",
+                 body=lambda rng, state: {"client": f"Client {rng.randint(0, 96)}", "description": "Bench"}, expect={201}),
+        Scenario("tenders.update", "PUT", lambda rng, state: f"/tenders/{tender(rng)}",
+                 body=lambda rng, state: {"description": f"Updated {rng.random()}"}),
+        Scenario("tenders.move", "PUT", lambda rng, state: f"/tenders/{tender(rng)}",
+                 body=lambda rng, state: {"client": f"Client {rng.randint(0, 96)}"}),
+        Scenario("tenders.delete", "DELETE", lambda rng, state: f"/tenders/{state}", setup=create_tender),
+        Scenario("products.create", "POST", lambda rng, state: "/products/",
+                 body=lambda rng, state: {"name": "Bench", "sku": f"NEW-{rng.getrandbits(48):012x}", "unit_sale_price": 20, "unit_cost": 10},
+                 expect={201}),
+        Scenario("products.bulk_upsert", "POST", lambda rng, state: "/products/bulk-upsert",
+                 body=lambda rng, state: [
+                     {"name": "Bench", "sku": sku(rng), "unit_sale_price": 30, "unit_cost": 10} for _ in range(50)
+                 ]),
+        Scenario("products.update", "PUT", lambda rng, state: f"/products/{product(rng)}",
+                 body=lambda rng, state: {"description": f"Updated {rng.random()}"}),
+        Scenario("products.reprice", "PUT", lambda rng, state: f"/products/{product(rng)}",
+                 body=lambda rng, state: {"unit_sale_price": rng.randint(2000, 4000) / 100, "unit_cost": 10}),
+        Scenario("products.delete", "DELETE", lambda rng, state: f"/products/{state}", setup=create_product),
+        Scenario("orders.create", "POST", lambda rng, state: "/orders/",
+                 body=lambda rng, state: {"tender_id": tender(rng), "product_id": product(rng), "awarded_quantity": 3},
+                 expect={201}),
+        Scenario("orders.bulk", "POST", lambda rng, state: "/orders/bulk",
+                 body=lambda rng, state: [
+                     {"tender_id": tender(rng), "product_id": product(rng), "awarded_quantity": 3} for _ in range(50)
+                 ]),
+        Scenario("orders.update", "PUT", lambda rng, state: f"/orders/{order(rng)}",
+                 body=lambda rng, state: {"awarded_quantity": rng.randint(1, 50)}),
+        Scenario("orders.delete", "DELETE", lambda rng, state: f"/orders/{state}", setup=create_order),
+    ]
+
+def percentile(ordered, q: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    return ordered[max(0, min(len(ordered) - 1, int(round(q * len(ordered))) - 1))]
+
+def statement_count(response: httpx.Response):
+    # Streaming bodies run their statements after the headers are sent, so exports undercount
+    timing = response.headers.get("server-timing", "")
+    if 'desc="' not in timing:
+        return None
+    return int(timing.split('desc="')[1].split(" ")[0])
+
+async def drive(client: httpx.AsyncClient, scenario: Scenario, concurrency: int, total: int, seed: int):
+    latencies = []
+    queries = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker(worker_id: int):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + worker_id)
+        while not queue.empty():
+            queue.get_nowait()
+            state = await scenario.setup(client, rng) if scenario.setup else None
+            body = scenario.body(rng, state) if scenario.body else None
+            path = scenario.path(rng, state)
+            start = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, path, json=body)
+            except httpx.TransportError:
+                # uvicorn closes the connection after an unhandled error
+                latencies.append(time.perf_counter() - start)
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status_code not in scenario.expect:
+                errors += 1
+            count = statement_count(response)
+            if count is not None:
+                queries.append(count)
+
+    with timed() as t:
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+
+    latencies.sort()
+    return {
+        "endpoint": scenario.name,
+        "method": scenario.method,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "seconds": t["elapsed"],
+        "throughput_rps": total / t["elapsed"],
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_queries": sum(queries) / len(queries) if queries else None,
+        "max_queries": max(queries) if queries else None,
+    }
+
+async def run_all(base_url: str, selected, levels, requests: int, warmup: int):
+    results = []
+    # Every run gets fresh random streams, so generated SKUs never repeat across runs
+    seeds = itertools.count()
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300) as client:
+        for scenario in selected:
+            total = max(1, int(requests * EXPORT_SHARE)) if scenario.export else requests
+            if warmup and not scenario.export:
+                await drive(client, scenario, 1, warmup, seed=next(seeds))
+            for concurrency in levels:
+                result = await drive(client, scenario, min(concurrency, total), total, seed=next(seeds))
+                result["concurrency"] = concurrency
+                results.append(result)
+                print(
+                    f"{scenario.name:<22} c={concurrency:<4} {result['throughput_rps']:9.1f} req/s"
+                    f"  p50 {result['p50_ms']:8.2f}  p95 {result['p95_ms']:8.2f}  p99 {result['p99_ms']:8.2f} ms"
+                    f"  {result['mean_queries'] if result['mean_queries'] is not None else '-':>6} queries"
+                    f"{'  ' + str(result['errors']) + ' errors' if result['errors'] else ''}"
+                )
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline: dict, current: dict, tolerance: float) -> int:
+    """Print p95 and throughput changes against a baseline; return the regression count"""
+    previous = {(r["endpoint"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'} (tolerance {tolerance:.0%})")
+    for result in current["results"]:
+        before = previous.get((result["endpoint"], result["concurrency"]))
+        if before is None:
+            continue
+        p95_change = result["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        rps_change = result["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+        more_queries = (
+            result["max_queries"] is not None and before["max_queries"] is not None
+            and result["max_queries"] > before["max_queries"]
+        )
+        regressed = p95_change > tolerance or rps_change < -tolerance or more_queries
+        regressions += regressed
+        print(
+            f"{result['endpoint']:<22} c={result['concurrency']:<4} p95 {p95_change:+7.1%}"
+            f"  throughput {rps_change:+7.1%}"
+            f"  queries {before['max_queries']} -> {result['max_queries']}"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=SIZES, default="1k")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--endpoints", help="comma-separated endpoint names (default: all)")
+    parser.add_argument("--async-db", action="store_true", help="run the server with DATABASE_ASYNC=true")
+    parser.add_argument("--port", type=int, default=8775)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="results file of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/throughput change when comparing")
+    args = parser.parse_args()
+
+    tenders, products, orders_per_tender = SIZES[args.size]
+    levels = [int(level) for level in args.concurrency.split(",")]
+    selected = scenarios(tenders, products, tenders * orders_per_tender)
+    if args.endpoints:
+        names = set(args.endpoints.split(","))
+        selected = [scenario for scenario in selected if scenario.name in names]
+
+    database_url = os.getenv("BENCH_DATABASE_URL")
+    if not database_url:
+        database_url = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    engine = make_engine(database_url)
+    with timed() as t:
+        populate(make_session(engine), tenders, products, orders_per_tender)
+    dialect = engine.dialect.name
+    engine.dispose()
+    print(f"{args.size}: {tenders} tenders, {products} products, {tenders * orders_per_tender} orders on {dialect}"
+          f" (populated in {t['elapsed']:.1f} s)")
+
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        DATABASE_ASYNC="true" if args.async_db else "false",
+        SEED_ON_STARTUP="false",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        asyncio.run(wait_until_ready(base_url))
+        results = asyncio.run(run_all(base_url, selected, levels, args.requests, args.warmup))
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database": dialect,
+        "async_db": args.async_db,
+        "size": args.size,
+        "rows": {"tenders": tenders, "products": products, "orders": tenders * orders_per_tender},
+        "requests": args.requests,
+        "concurrency": levels,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        if regressions:
+            print(f"{regressions} regressions")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Load-test the API with the sync and the async database layer.
+
+Starts one uvicorn worker per mode against the same pre-populated database
+and drives concurrent GET requests at it.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_async_load --concurrency 64 --requests 4000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import make_engine, make_session, populate, wait_until_ready
+
+ENDPOINTS = [
+    "/tenders/?limit=50",
+    "/products/?limit=50",
+    "/orders/?limit=50",
+    "/tenders/1",
+]
+
+async def drive(base_url: str, concurrency: int, total: int):
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(ENDPOINTS[i % len(ENDPOINTS)])
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker():
+            while not queue.empty():
+                path = queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+def run_mode(async_mode: bool, database_url: str, port: int, args):
+    env = dict(os.environ, DATABASE_URL=database_url, DATABASE_ASYNC="true" if async_mode else "false")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        asyncio.run(wait_until_ready(base_url))
+        asyncio.run(drive(base_url, args.concurrency, min(200, args.requests)))  # warm up
+        elapsed, latencies = asyncio.run(drive(base_url, args.concurrency, args.requests))
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    label = "async" if async_mode else "sync"
+    print(
+        f"{label:<6} {args.requests / elapsed:10.1f} req/s"
+        f"  p50 {statistics.median(latencies) * 1000:8.2f} ms"
+        f"  p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:8.2f} ms"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--tenders", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--orders-per-tender", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    database_url = os.getenv("BENCH_DATABASE_URL")
+    if not database_url:
+        database_url = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    engine = make_engine(database_url)
+    populate(make_session(engine), args.tenders, args.products, args.orders_per_tender)
+    engine.dispose()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}")
+    run_mode(False, database_url, args.port, args)
+    run_mode(True, database_url, args.port + 1, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Compare bulk order ingestion against creating orders one at a time.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_bulk_orders --orders 5000
+"""
+import argparse
+import random
+
+from benchmarks.common import make_engine, make_session, populate, measure, report
+
+import crud
+import schemas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--tenders", type=int, default=100)
+    parser.add_argument("--products", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    payload = [
+        schemas.OrderCreate(
+            tender_id=rng.randint(1, args.tenders),
+            product_id=rng.randint(1, args.products),
+            awarded_quantity=rng.randint(1, 50),
+        )
+        for _ in range(args.orders)
+    ]
+
+    engine = make_engine()
+    db = make_session(engine)
+    populate(db, args.tenders, args.products, orders_per_tender=0)
+
+    def run_loop():
+        for order in payload:
+            crud.create_order(db, order)
+
+    def run_bulk():
+        created, errors = crud.create_orders_bulk(db, payload)
+        assert len(created) == len(payload) and not errors
+
+    loop_time, loop_queries, _ = measure(engine, run_loop, repeat=1)
+    bulk_time, bulk_queries, _ = measure(engine, run_bulk, repeat=1)
+
+    print(f"{args.orders} orders")
+    report("create_order loop", loop_time, loop_queries)
+    report("create_orders_bulk", bulk_time, bulk_queries)
+    print(f"speedup: {loop_time / bulk_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
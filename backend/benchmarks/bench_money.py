@@ -0,0 +1,88 @@
+"""Check exact money totals against a float baseline and time both.
+
+Tender margins are aggregated three ways over the same order lines: in SQL
+on the integer cent columns (what the rollups use), in Python with Decimal
+(what the tender detail view uses), and with the previous floating point
+arithmetic in SQL and Python. The exact paths must agree to the cent; the
+float baseline reports how far it drifts. Large tenders are used so that a
+throughput regression in the exact paths shows.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_money --tenders 50 --orders-per-tender 20000
+"""
+import argparse
+
+from sqlalchemy import Float, cast, func
+
+from benchmarks.common import make_engine, make_session, populate, measure, report
+
+from database import Product, Order
+from money import to_decimal
+import crud
+import rollups
+
+def float_totals_query(db):
+    """Per-tender margins with the prices as floats, as before money was stored in cents"""
+    sale = cast(Product.unit_sale_price, Float) / 100
+    cost = cast(Product.unit_cost, Float) / 100
+    return (
+        db.query(Order.tender_id, func.sum((sale - cost) * Order.awarded_quantity))
+        .join(Product, Order.product_id == Product.id)
+        .group_by(Order.tender_id)
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenders", type=int, default=50)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--orders-per-tender", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    db = make_session(engine)
+    populate(db, args.tenders, args.products, args.orders_per_tender)
+    print(f"{args.tenders} tenders x {args.orders_per_tender} orders")
+
+    exact_time, exact_queries, exact = measure(
+        engine, lambda: {row.tender_id: row.total_margin for row in rollups.order_totals_query(db)}, args.repeat
+    )
+    float_time, float_queries, floats = measure(engine, lambda: dict(float_totals_query(db).all()), args.repeat)
+
+    # Python: one large tender's lines, summed as Decimal and as float
+    prices = {
+        product_id: (sale, cost)
+        for product_id, sale, cost in db.query(Product.id, Product.unit_sale_price, Product.unit_cost)
+    }
+    lines = db.query(Order.product_id, Order.awarded_quantity).filter(Order.tender_id == 1).all()
+
+    def sum_decimal():
+        return sum((prices[product_id][0] - prices[product_id][1]) * quantity for product_id, quantity in lines)
+
+    def sum_float():
+        return sum(
+            (float(prices[product_id][0]) - float(prices[product_id][1])) * quantity for product_id, quantity in lines
+        )
+
+    decimal_time, _, decimal_total = measure(engine, sum_decimal, args.repeat)
+    python_float_time, _, python_float_total = measure(engine, sum_float, args.repeat)
+    detail_time, detail_queries, details = measure(engine, lambda: crud.get_tender_details_data(db, 1), args.repeat)
+
+    # The exact paths agree to the cent
+    assert decimal_total == exact[1] == details["total_margin"]
+    assert all(to_decimal(value) == value for value in exact.values())
+
+    drift = [abs(to_decimal(floats[tender_id]) - total) for tender_id, total in exact.items()]
+    raw_drift = max(abs(floats[tender_id] - float(total)) for tender_id, total in exact.items())
+    print(f"float baseline: {sum(1 for d in drift if d)} of {len(exact)} tenders off by a cent or more, "
+          f"max error {raw_drift:.3g} before rounding; Python float sum of tender 1 off by "
+          f"{abs(python_float_total - float(decimal_total)):.3g}")
+
+    report("SQL exact (cents)", exact_time, exact_queries)
+    report("SQL float baseline", float_time, float_queries)
+    report("Python Decimal sum", decimal_time, 0)
+    report("Python float baseline", python_float_time, 0)
+    report(f"tender detail ({len(lines)} rows)", detail_time, detail_queries)
+
+if __name__ == "__main__":
+    main()
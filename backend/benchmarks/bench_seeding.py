@@ -0,0 +1,120 @@
+"""Seed a scratch database from a local stand-in for the sample feeds.
+
+The stand-in server answers each feed after a fixed latency and fails the
+first request to each feed with a 503, so a run exercises the retries and
+shows whether the feeds are fetched concurrently. Seeding runs twice to
+check that the second run adds nothing.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_seeding --products 2000 --tenders 500 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The seeder uses the application database, so point it at a scratch file first
+SCRATCH_DB = os.path.join(tempfile.mkdtemp(), "seed.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{SCRATCH_DB}"
+
+def make_feeds(products: int, tenders: int, orders: int) -> dict:
+    return {
+        "/product-sample": [
+            {"sku": f"SKU-{i:06d}", "title": f"Product {i}", "cost": 10 + i % 90, "description": None}
+            for i in range(products)
+        ],
+        "/tender-sample": [
+            {"id": i, "client": f"Client {i % 37}", "creation_date": "2024-01-01"}
+            for i in range(tenders)
+        ],
+        "/order-sample": [{"awarded_quantity": 1 + i % 40} for i in range(orders)],
+    }
+
+def start_server(feeds: dict, latency: float):
+    failed = set()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            with lock:
+                first = self.path not in failed
+                failed.add(self.path)
+            if self.path not in feeds or first:
+                self.send_response(404 if self.path not in feeds else 503)
+                self.end_headers()
+                return
+            body = json.dumps(feeds[self.path]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--tenders", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    server = start_server(make_feeds(args.products, args.tenders, args.orders), args.latency)
+    base = f"http://127.0.0.1:{server.server_port}"
+    os.environ["SEED_PRODUCT_URL"] = f"{base}/product-sample"
+    os.environ["SEED_TENDER_URL"] = f"{base}/tender-sample"
+    os.environ["SEED_ORDER_URL"] = f"{base}/order-sample"
+
+    from database import SessionLocal, Product, Tender, Order, init_db
+    import rollups
+    import seed_data
+
+    init_db()
+
+    def counts():
+        db = SessionLocal()
+        try:
+            return {model.__tablename__: db.query(model).count() for model in (Product, Tender, Order)}
+        finally:
+            db.close()
+
+    start = time.perf_counter()
+    asyncio.run(seed_data.seed_database())
+    first_run = time.perf_counter() - start
+    first = counts()
+
+    start = time.perf_counter()
+    asyncio.run(seed_data.seed_database())
+    second_run = time.perf_counter() - start
+    second = counts()
+
+    db = SessionLocal()
+    try:
+        drift = rollups.check_tender_margins(db) + rollups.check_daily_margins(db) + rollups.check_day_margins(db)
+    finally:
+        db.close()
+    server.shutdown()
+
+    assert first == {"products": args.products, "tenders": args.tenders, "orders": args.orders}, first
+    assert second == first, (first, second)
+    assert not drift, drift[:5]
+
+    # Each feed needs two round trips (a 503, then the retry)
+    sequential = 3 * (2 * args.latency + seed_data.FETCH_BACKOFF)
+    print(f"first run:  {first_run * 1000:10.2f} ms  {first}")
+    print(f"second run: {second_run * 1000:10.2f} ms  (no new rows)")
+    print(f"sequential fetch floor: {sequential * 1000:10.2f} ms")
+
+if __name__ == "__main__":
+    main()
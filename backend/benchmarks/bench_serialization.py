@@ -0,0 +1,136 @@
+"""Compare the orjson row-dict responses against Pydantic response_model serialization.
+
+The legacy path builds schema objects and runs them through FastAPI's
+response_model validation and JSONResponse, as the endpoints used to. Both
+paths must produce the same JSON.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_serialization --tenders 20000
+"""
+import argparse
+import asyncio
+import json
+import random
+from typing import List
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from benchmarks.common import make_engine, make_session, populate, measure, report
+
+from sqlalchemy.orm import joinedload
+
+from database import Order, Tender
+from product_cache import product_cache
+from serialization import json_response
+import crud
+import schemas
+
+def eager_tender_with_details(db, tender_id: int):
+    """The joined-load ORM detail view the endpoint served before row dicts, kept as a baseline"""
+    tender = (
+        db.query(Tender)
+        .options(joinedload(Tender.orders).joinedload(Order.product))
+        .filter(Tender.id == tender_id)
+        .first()
+    )
+    orders = []
+    total_margin = 0
+    for order in sorted(tender.orders, key=lambda o: o.id):
+        margin = crud.calculate_margin(order.product, order.awarded_quantity)
+        total_margin += margin
+        orders.append(schemas.OrderWithDetails(
+            id=order.id,
+            tender_id=order.tender_id,
+            product_id=order.product_id,
+            awarded_quantity=order.awarded_quantity,
+            product=order.product,
+            margin=margin
+        ))
+    return schemas.TenderWithDetails(
+        id=tender.id,
+        client=tender.client,
+        award_date=tender.award_date,
+        description=tender.description,
+        orders=orders,
+        total_margin=total_margin
+    )
+
+def legacy_body(response_model, content) -> bytes:
+    """Serialize content the way an endpoint returning schema objects did"""
+    field = create_response_field(name="response", type_=response_model)
+    payload = asyncio.run(serialize_response(field=field, response_content=content))
+    return JSONResponse(payload).body
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenders", type=int, default=20000)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--orders-per-tender", type=int, default=5)
+    parser.add_argument("--detail-orders", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    db = make_session(engine)
+    populate(db, args.tenders, args.products, args.orders_per_tender)
+    # One large tender for the detail view
+    rng = random.Random(11)
+    db.bulk_insert_mappings(Order, [
+        {"tender_id": 1, "product_id": rng.randint(1, args.products), "awarded_quantity": rng.randint(1, 50)}
+        for _ in range(args.detail_orders)
+    ])
+    db.commit()
+
+    cases = [
+        (
+            f"tenders (limit {args.tenders})",
+            List[schemas.TenderSummary],
+            lambda: crud.get_tenders_summary(db, limit=args.tenders),
+            lambda: crud.get_tender_summary_rows(db, limit=args.tenders),
+        ),
+        (
+            f"orders (limit {args.tenders})",
+            List[schemas.Order],
+            lambda: crud.get_orders(db, limit=args.tenders),
+            lambda: crud.get_order_rows(db, limit=args.tenders),
+        ),
+        (
+            f"products (limit {args.products})",
+            List[schemas.Product],
+            lambda: product_cache.invalidate() or crud.get_products_cached(db, limit=args.products),
+            lambda: product_cache.invalidate() or crud.get_product_rows_cached(db, limit=args.products),
+        ),
+        (
+            f"tender detail ({args.detail_orders + args.orders_per_tender} orders)",
+            schemas.TenderWithDetails,
+            lambda: eager_tender_with_details(db, 1),
+            lambda: crud.get_tender_details_data(db, 1),
+        ),
+    ]
+
+    for label, response_model, load_legacy, load_fast in cases:
+        def legacy():
+            db.expire_all()
+            return legacy_body(response_model, load_legacy())
+
+        def fast():
+            db.expire_all()
+            return json_response(Response(), load_fast()).body
+
+        legacy_time, legacy_queries, legacy_json = measure(engine, legacy, args.repeat)
+        fast_time, fast_queries, fast_json = measure(engine, fast, args.repeat)
+
+        # The response shape must not change
+        assert json.loads(legacy_json) == json.loads(fast_json), label
+        identical = "identical bytes" if legacy_json == fast_json else "same JSON"
+
+        print(label)
+        report("  response_model", legacy_time, legacy_queries)
+        report("  orjson rows", fast_time, fast_queries)
+        print(f"  speedup: {legacy_time / fast_time:.1f}x, {identical}")
+
+if __name__ == "__main__":
+    main()
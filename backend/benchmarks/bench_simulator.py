@@ -0,0 +1,76 @@
+"""Time the NumPy margin simulator over a large order matrix.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_simulator --tenders 100000 --orders-per-tender 10
+"""
+import argparse
+import random
+from decimal import Decimal
+
+from benchmarks.common import make_engine, make_session, populate, measure, report
+
+from database import Product, Order, TenderMargin
+from money import ZERO, to_decimal
+import schemas
+import simulator
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenders", type=int, default=100000)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--orders-per-tender", type=int, default=10)
+    parser.add_argument("--changes", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    db = make_session(engine)
+    populate(db, args.tenders, args.products, args.orders_per_tender)
+
+    rng = random.Random(7)
+    skus = [sku for (sku,) in db.query(Product.sku)]
+    request = schemas.MarginSimulationRequest(changes=[
+        schemas.PriceChange(sku=sku, cost_change_pct=rng.uniform(-10, 10))
+        for sku in rng.sample(skus, args.changes)
+    ])
+
+    def run_cold():
+        simulator._matrix = None
+        return simulator.simulate_margins(db, request)
+
+    cold_time, cold_queries, _ = measure(engine, run_cold, args.repeat)
+    warm_time, warm_queries, result = measure(engine, lambda: simulator.simulate_margins(db, request), args.repeat)
+
+    def run_stale():
+        # As after an order write: the previous matrix is served while a new one loads
+        simulator._matrix.version = -1
+        return simulator.simulate_margins(db, request)
+
+    stale_time, stale_queries, stale = measure(engine, run_stale, 1)
+    reload = simulator._reload
+    if reload is not None:
+        reload.join()
+    assert simulator._matrix.version != -1
+    assert stale.total_delta == result.total_delta
+
+    # Margins are exact cents, so the baseline must equal the materialized rollup
+    stored = sum(margin for (margin,) in db.query(TenderMargin.total_margin))
+    assert result.total_margin_before == float(stored)
+
+    # The delta must equal a plain recomputation with the changed costs rounded to the cent
+    cost_pct = {change.sku: change.cost_change_pct for change in request.changes}
+    expected = ZERO
+    rows = db.query(Product.sku, Product.unit_cost, Order.awarded_quantity).join(Order).filter(Product.sku.in_(cost_pct))
+    for sku, cost, quantity in rows:
+        new_cost = to_decimal(cost * (1 + Decimal(str(cost_pct[sku])) / 100))
+        expected -= (new_cost - cost) * quantity
+    assert result.total_delta == float(expected)
+
+    print(f"{args.tenders * args.orders_per_tender} order lines, {args.changes} SKU changes, "
+          f"{result.affected_tenders} tenders affected")
+    report("cold (load matrix)", cold_time, cold_queries)
+    report("warm (cached matrix)", warm_time, warm_queries)
+    report("stale (reload in background)", stale_time, stale_queries)
+
+if __name__ == "__main__":
+    main()
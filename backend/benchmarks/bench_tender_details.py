@@ -0,0 +1,91 @@
+"""Compare the tender detail view against the per-order loop it replaced.
+
+Also compares opening several tender detail panes one request at a time
+against a single batch load (GET /tenders/details).
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_tender_details --lines 10,100,500 --panes 10
+"""
+import argparse
+
+from benchmarks.common import make_engine, make_session, populate, measure, report
+
+import crud
+import schemas
+
+def legacy_tender_with_details(db, tender_id: int):
+    """The original implementation issuing one product query per order, kept as a baseline"""
+    tender = crud.get_tender(db, tender_id)
+    orders = crud.get_orders_by_tender(db, tender_id)
+    details = []
+    total_margin = 0
+    for order in orders:
+        product = crud.get_product(db, order.product_id)
+        margin = crud.calculate_margin(product, order.awarded_quantity)
+        total_margin += margin
+        details.append(schemas.OrderWithDetails(
+            id=order.id,
+            tender_id=order.tender_id,
+            product_id=order.product_id,
+            awarded_quantity=order.awarded_quantity,
+            product=product,
+            margin=margin
+        ))
+    return schemas.TenderWithDetails(
+        id=tender.id,
+        client=tender.client,
+        award_date=tender.award_date,
+        description=tender.description,
+        orders=details,
+        total_margin=total_margin
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", default="10,100,500",
+                        help="comma separated order line counts per tender")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--panes", type=int, default=10,
+                        help="tenders opened at once for the batch comparison")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for lines in [int(n) for n in args.lines.split(",")]:
+        engine = make_engine()
+        db = make_session(engine)
+        populate(db, tenders=1, products=args.products, orders_per_tender=lines)
+
+        def run_legacy():
+            db.expire_all()
+            return legacy_tender_with_details(db, 1)
+
+        def run_current():
+            db.expire_all()
+            return crud.get_tender_details_data(db, 1)
+
+        legacy_time, legacy_queries, legacy = measure(engine, run_legacy, args.repeat)
+        current_time, current_queries, current = measure(engine, run_current, args.repeat)
+        assert sorted(o.id for o in legacy.orders) == [order["id"] for order in current["orders"]]
+
+        print(f"{lines} order lines")
+        report("per-order loop", legacy_time, legacy_queries)
+        report("row query", current_time, current_queries)
+        db.close()
+        engine.dispose()
+
+    engine = make_engine()
+    db = make_session(engine)
+    populate(db, tenders=args.panes, products=args.products, orders_per_tender=100)
+    ids = list(range(1, args.panes + 1))
+    per_tender_time, per_tender_queries, per_tender = measure(
+        engine, lambda: {tender_id: crud.get_tender_details_data(db, tender_id) for tender_id in ids}, args.repeat
+    )
+    batch_time, batch_queries, batch = measure(engine, lambda: crud.get_tenders_details_data(db, ids), args.repeat)
+    assert per_tender == batch
+
+    print(f"{args.panes} tenders x 100 order lines")
+    report("one request per tender", per_tender_time, per_tender_queries)
+    report("batch", batch_time, batch_queries)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compare the rollup-backed tender summary against the per-tender loop.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_tender_summary --tenders 2000
+"""
+import argparse
+
+from benchmarks.common import make_engine, make_session, populate, measure, report
+
+import crud
+import schemas
+
+def legacy_tenders_summary(db, skip: int = 0, limit: int = 100):
+    """The original 1 + N + N*M implementation, kept as a baseline"""
+    tenders = crud.get_tenders(db, skip, limit)
+    summaries = []
+    for tender in tenders:
+        orders = crud.get_orders_by_tender(db, tender.id)
+        total_margin = 0
+        for order in orders:
+            product = crud.get_product(db, order.product_id)
+            total_margin += crud.calculate_margin(product, order.awarded_quantity)
+        summaries.append(schemas.TenderSummary(
+            id=tender.id,
+            client=tender.client,
+            award_date=tender.award_date,
+            description=tender.description,
+            product_count=len(orders),
+            total_margin=total_margin
+        ))
+    return summaries
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenders", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--orders-per-tender", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    db = make_session(engine)
+    populate(db, args.tenders, args.products, args.orders_per_tender)
+    limit = args.tenders
+
+    def run_legacy():
+        db.expire_all()
+        return legacy_tenders_summary(db, limit=limit)
+
+    def run_aggregated():
+        db.expire_all()
+        return crud.get_tenders_summary(db, limit=limit)
+
+    legacy_time, legacy_queries, legacy = measure(engine, run_legacy, args.repeat)
+    agg_time, agg_queries, aggregated = measure(engine, run_aggregated, args.repeat)
+
+    # Money sums are exact, so summation order cannot change them
+    assert sorted(legacy, key=lambda s: s.id) == aggregated
+
+    print(f"{args.tenders} tenders x {args.orders_per_tender} orders")
+    report("per-tender loop", legacy_time, legacy_queries)
+    report("margin rollup", agg_time, agg_queries)
+    print(f"speedup: {legacy_time / agg_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
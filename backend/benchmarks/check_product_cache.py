@@ -0,0 +1,94 @@
+"""Fail when a product write in one worker leaves another worker's cache stale.
+
+Two ProductCache instances stand in for two workers, each with a
+RedisBackend over the same in-memory fake Redis client. Worker B caches a
+product listing and detail, worker A updates the product through crud.py,
+and worker B must then miss and load the new name. B's reads keep the
+products table version in their keys fixed, so only the shared generation
+counter can invalidate them.
+
+Usage (from the backend directory):
+    python -m benchmarks.check_product_cache
+"""
+import sys
+import threading
+import time
+from unittest import mock
+
+from benchmarks.common import make_engine, make_session, populate
+
+import crud
+from product_cache import ProductCache, RedisBackend
+import schemas
+
+class FakeRedis:
+    """The subset of redis.Redis the backend uses, over a dict; values come back as bytes"""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._values[key] = (str(value).encode(), time.monotonic() + ex if ex else None)
+
+    def incr(self, key):
+        with self._lock:
+            value, _ = self._values.get(key, (b"0", None))
+            value = int(value) + 1
+            self._values[key] = (str(value).encode(), None)
+            return value
+
+def main():
+    engine = make_engine()
+    db = make_session(engine)
+    populate(db, 10, 5, 2)
+
+    redis = FakeRedis()
+    worker_a = ProductCache(RedisBackend(redis))
+    worker_b = ProductCache(RedisBackend(redis))
+    version = crud.products_version(db)
+
+    def read_in_b():
+        with mock.patch.object(crud, "product_cache", worker_b):
+            listing = crud.get_product_rows_cached(db, limit=5, version=version)
+            detail = crud.get_product_cached(db, 1, version=version)
+        return [row["name"] for row in listing if row["id"] == 1][0], detail.name
+
+    failures = []
+    def check(label, ok):
+        print(f"{label:<52} {'ok' if ok else 'FAILED'}")
+        if not ok:
+            failures.append(label)
+
+    names = read_in_b()
+    cached = read_in_b()
+    check("worker B serves its listing and detail from cache", worker_b.hits == 2 and cached == names)
+
+    with mock.patch.object(crud, "product_cache", worker_a):
+        crud.update_product(db, 1, schemas.ProductUpdate(name="Renamed in worker A"))
+    check("worker A's write bumps the shared generation", worker_a.invalidations == 1)
+
+    misses = worker_b.misses
+    names = read_in_b()
+    check("worker B misses on its listing and detail", worker_b.misses == misses + 2)
+    check("worker B serves the new name", names == ("Renamed in worker A", "Renamed in worker A"))
+
+    if failures:
+        print(f"{len(failures)} checks failed")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Fail when an endpoint runs more SQL statements than its budget.
+
+Requests run through the app against a scratch SQLite database with the
+query budget test mode of request_metrics enabled, so an N+1 regression
+fails with QueryBudgetExceeded instead of just getting slower.
+
+Usage (from the backend directory):
+    python -m benchmarks.check_query_budgets
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+# The app uses the application database, so point it at a scratch file first
+SCRATCH_DB = os.path.join(tempfile.mkdtemp(), "budgets.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{SCRATCH_DB}"
+
+# (method, path, route template, JSON body, statement budget)
+CHECKS = [
+    ("GET", "/tenders/", "/tenders/", None, 2),
+    ("GET", "/tenders/?include_total=true", "/tenders/", None, 3),
+    ("GET", "/tenders/1", "/tenders/{tender_id}", None, 3),
+    ("GET", "/tenders/details?ids=1,2,3,4,5,6,7,8,9,10", "/tenders/details", None, 3),
+    ("POST", "/tenders/details", "/tenders/details", {"ids": list(range(1, 21))}, 2),
+    ("GET", "/tenders/1/validate", "/tenders/{tender_id}/validate", None, 1),
+    ("GET", "/products/", "/products/", None, 2),
+    ("GET", "/products/1", "/products/{product_id}", None, 2),
+    ("GET", "/orders/", "/orders/", None, 2),
+    ("GET", "/orders/1", "/orders/{order_id}", None, 2),
+    ("GET", "/analytics/margins", "/analytics/margins", None, 11),
+    ("GET", "/analytics/margins/timeseries?bucket=month&split=client", "/analytics/margins/timeseries", None, 2),
+    ("GET", "/search/tenders?q=client%201", "/search/tenders", None, 2),
+    ("GET", "/search/products?q=sku-00001", "/search/products", None, 2),
+    ("POST", "/simulate/margins", "/simulate/margins", {"changes": [{"sku": "SKU-0000001", "cost_change_pct": 5}]}, 3),
+    ("POST", "/orders/", "/orders/", {"tender_id": 1, "product_id": 1, "awarded_quantity": 3}, 7),
+    ("POST", "/orders/bulk", "/orders/bulk", [{"tender_id": 2, "product_id": 2, "awarded_quantity": 3}] * 50, 7),
+    # Moving or deleting orders adds a statement per daily rollup table that is left with empty rows
+    ("PUT", "/orders/3", "/orders/{order_id}", {"tender_id": 3, "awarded_quantity": 5}, 10),
+    ("DELETE", "/orders/4", "/orders/{order_id}", None, 10),
+    ("PUT", "/products/3", "/products/{product_id}", {"unit_sale_price": 40, "unit_cost": 10}, 7),
+    ("PUT", "/tenders/3", "/tenders/{tender_id}", {"client": "Client 7"}, 9),
+    ("DELETE", "/tenders/5", "/tenders/{tender_id}", None, 11),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenders", type=int, default=200)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--orders-per-tender", type=int, default=20)
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    from benchmarks.common import populate
+    from database import SessionLocal, init_db
+    from main import app
+    import request_metrics
+
+    init_db()
+    db = SessionLocal()
+    populate(db, args.tenders, args.products, args.orders_per_tender)
+    db.close()
+
+    client = TestClient(app)
+    failures = 0
+    for method, path, route, body, budget in CHECKS:
+        request_metrics.set_query_budget(budget, route=route)
+        try:
+            response = client.request(method, path, json=body)
+            queries = int(response.headers["server-timing"].split('desc="')[1].split(" ")[0])
+            outcome = "ok" if response.status_code < 400 else f"HTTP {response.status_code}"
+        except request_metrics.QueryBudgetExceeded:
+            queries = None
+            outcome = "OVER BUDGET"
+        finally:
+            request_metrics.set_query_budget(None, route=route)
+        if outcome != "ok":
+            failures += 1
+        print(f"{method:<5} {path:<58} {queries if queries is not None else '>' + str(budget):>5} / {budget:<3} {outcome}")
+
+    if failures:
+        print(f"{failures} checks failed")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Shared helpers for the backend benchmarks.
+
+Benchmarks run against their own database (``BENCH_DATABASE_URL``, an
+in-memory SQLite database by default) so they never touch application data.
+"""
+import asyncio
+import os
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+# Keep importing the application modules from connecting to a real database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import httpx
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, Tender, Product, Order
+import rollups
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "sqlite://")
+
+# Award dates are spread over this many days so the time series have history
+AWARD_DAYS = 730
+AWARD_START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+def make_engine(url: str = BENCH_DATABASE_URL):
+    """Create an engine with a fresh schema for benchmarking"""
+    if url.startswith("sqlite"):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+    else:
+        engine = create_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+def make_session(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+def populate(db, tenders: int, products: int, orders_per_tender: int, seed: int = 42):
+    """Fill the schema with deterministic synthetic data"""
+    rng = random.Random(seed)
+    product_rows = []
+    for i in range(1, products + 1):
+        cost = round(rng.uniform(1, 500), 2)
+        product_rows.append({
+            "id": i,
+            "name": f"Product {i}",
+            "sku": f"SKU-{i:07d}",
+            "unit_cost": cost,
+            "unit_sale_price": round(cost * rng.uniform(1.05, 1.6), 2),
+            "description": None,
+        })
+    db.bulk_insert_mappings(Product, product_rows)
+    db.bulk_insert_mappings(Tender, [
+        {
+            "id": i,
+            "client": f"Client {i % 97}",
+            "award_date": AWARD_START + timedelta(days=i % AWARD_DAYS),
+            "description": f"Tender {i}",
+        }
+        for i in range(1, tenders + 1)
+    ])
+    order_id = 0
+    batch = []
+    for tender_id in range(1, tenders + 1):
+        for _ in range(orders_per_tender):
+            order_id += 1
+            batch.append({
+                "id": order_id,
+                "tender_id": tender_id,
+                "product_id": rng.randint(1, products),
+                "awarded_quantity": rng.randint(1, 50),
+            })
+        if len(batch) >= 10000:
+            db.bulk_insert_mappings(Order, batch)
+            batch = []
+    if batch:
+        db.bulk_insert_mappings(Order, batch)
+    db.commit()
+    reset_sequences(db)
+    rollups.rebuild_all(db)
+
+def reset_sequences(db):
+    """Move PostgreSQL id sequences past the explicit ids inserted by ``populate``"""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for table in ("tenders", "products", "orders"):
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {table}), false)"
+        ))
+    db.commit()
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0):
+    """Poll ``/health`` until a freshly started server answers"""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready")
+
+class QueryCounter:
+    """Count statements executed on an engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _before_cursor_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+
+@contextmanager
+def timed():
+    """Yield a dict whose ``elapsed`` key holds the block's wall time in seconds"""
+    result = {}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["elapsed"] = time.perf_counter() - start
+
+def measure(engine, fn, repeat: int = 3):
+    """Run ``fn`` ``repeat`` times; return (best seconds, queries per call, result)"""
+    best = None
+    queries = 0
+    result = None
+    for _ in range(repeat):
+        with QueryCounter(engine) as counter, timed() as t:
+            result = fn()
+        queries = counter.count
+        best = t["elapsed"] if best is None else min(best, t["elapsed"])
+    return best, queries, result
+
+def report(label: str, seconds: float, queries: int):
+    print(f"{label:<28} {seconds * 1000:10.2f} ms {queries:8d} queries")
@@ -0,0 +1,83 @@
+"""Check that the hot query paths are served by indexes.
+
+Runs EXPLAIN on each hot query and fails when the plan does not mention
+the expected index. Runs against ``BENCH_DATABASE_URL`` (in-memory SQLite by
+default); on PostgreSQL sequential scans are disabled for the check so the
+planner's choice on a small table does not mask a missing index.
+
+Usage (from the backend directory):
+    python -m benchmarks.explain_hot_queries
+"""
+import sys
+
+from sqlalchemy import text
+
+from benchmarks.common import make_engine, make_session, populate
+
+import crud
+from database import Tender, Product, Order
+
+# (description, query builder, index expected in the plan)
+HOT_QUERIES = [
+    (
+        "orders by tender (get_orders_by_tender, rollup refresh)",
+        lambda db: db.query(Order).filter(Order.tender_id == 1),
+        "ix_orders_tender_id_product_id",
+    ),
+    (
+        "orders by product (product price refresh)",
+        lambda db: db.query(Order.tender_id).filter(Order.product_id == 1).distinct(),
+        "ix_orders_product_id",
+    ),
+    (
+        "tenders by award date",
+        lambda db: db.query(Tender).order_by(Tender.award_date).limit(50),
+        "ix_tenders_award_date",
+    ),
+    (
+        "tender list filtered by client (GET /tenders/?client=)",
+        lambda db: crud.tender_summary_query(db).filter(*crud.tender_filters(client="Client 1")).limit(50),
+        "ix_tenders_client",
+    ),
+    (
+        "product list sorted by name (GET /products/?sort=name)",
+        lambda db: crud.paginate(
+            db.query(Product), Product.id, limit=50,
+            sort_keys=crud.sort_keys(crud.PRODUCT_SORT_COLUMNS, [("name", False)], Product.id),
+        ),
+        "ix_products_name",
+    ),
+    (
+        "order list filtered by SKU (GET /orders/?sku=)",
+        lambda db: db.query(Order).filter(*crud.order_filters(sku="SKU-0000001")).limit(50),
+        "ix_orders_product_id",
+    ),
+]
+
+def explain(db, query) -> str:
+    dialect = db.get_bind().dialect
+    statement = query.statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN QUERY PLAN" if dialect.name == "sqlite" else "EXPLAIN"
+    rows = db.execute(text(f"{prefix} {statement}")).fetchall()
+    return "\n".join(" ".join(str(value) for value in row) for row in rows)
+
+def main():
+    engine = make_engine()
+    db = make_session(engine)
+    populate(db, tenders=200, products=50, orders_per_tender=5)
+    if engine.dialect.name == "postgresql":
+        db.execute(text("ANALYZE"))
+        db.execute(text("SET enable_seqscan = off"))
+
+    failures = 0
+    for description, build, index in HOT_QUERIES:
+        plan = explain(db, build(db))
+        ok = index in plan
+        failures += not ok
+        print(f"[{'ok' if ok else 'FAIL'}] {description}: expects {index}")
+        if not ok:
+            print("    " + plan.replace("\n", "\n    "))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,41 +1,227 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import Tender, Product, Order
+from sqlalchemy import and_, func, insert, or_, select, union_all
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import Tender, Product, Order, TableVersion, TenderMargin
+from analytics import date_filters
+from money import ZERO, to_decimal
+from pagination import Cursor
+import rollups
+from product_cache import product_cache
 import schemas
-from typing import List, Optional
+from serialization import schema_fields
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional, Sequence, Tuple
 
-def calculate_margin(product: Product, quantity: int) -> float:
-    """Calculate margin for a product order"""
+def paginate(query, id_column, skip: int = 0, limit: int = 100, after: Optional[Cursor] = None, sort_keys: Sequence = ()):
+    """Apply sort_keys ordering with either keyset (after) or offset (skip) pagination
+    
+    sort_keys are (expression, descending) pairs and must end with id_column so the
+    order is total; they default to ascending id. ``after`` carries the last row's
+    values for every sort key but the trailing id (a bare id is enough for the
+    default order).
+    """
+    sort_keys = list(sort_keys) or [(id_column, False)]
+    query = query.order_by(*[key.desc() if descending else key.asc() for key, descending in sort_keys])
+    if after is not None:
+        if isinstance(after, int):
+            after = Cursor(after)
+        # Keyset pagination: seek past the last row's values, which the cursor
+        # carries, so rows changed or deleted since do not derail the seek; on
+        # the default order this is a range scan on id
+        anchors = list(after.values)
+        if len(anchors) < len(sort_keys):
+            anchors.append(after.id)
+        if len(anchors) != len(sort_keys):
+            raise ValueError("Cursor does not match the sort order")
+        seek = []
+        for index, ((key, descending), anchor) in enumerate(zip(sort_keys, anchors)):
+            ties = [previous == value for (previous, _), value in zip(sort_keys[:index], anchors[:index])]
+            seek.append(and_(*ties, key < anchor if descending else key > anchor))
+        return query.filter(or_(*seek) if len(seek) > 1 else seek[0]).limit(limit)
+    return query.offset(skip).limit(limit)
+
+def sort_keys(columns: dict, sort: Sequence[Tuple[str, bool]], id_column) -> list:
+    """Map parsed (field, descending) sort terms onto columns, ending with id as the tie-breaker"""
+    keys = [(columns[field], descending) for field, descending in sort]
+    if not any(key is id_column for key, _ in keys):
+        keys.append((id_column, False))
+    return keys
+
+# Columns overwritten when a bulk upsert matches an existing SKU
+PRODUCT_UPSERT_FIELDS = ["name", "unit_sale_price", "unit_cost", "description"]
+
+# Response fields in serialization order, for the row-dict read paths
+TENDER_FIELDS = schema_fields(schemas.Tender)
+PRODUCT_FIELDS = schema_fields(schemas.Product)
+ORDER_FIELDS = schema_fields(schemas.Order)
+
+# Total margin of a tender as read from its rollup row
+TENDER_TOTAL_MARGIN = func.coalesce(TenderMargin.total_margin, 0)
+TENDER_PRODUCT_COUNT = func.coalesce(TenderMargin.order_count, 0)
+
+# Sortable fields of each listing; every one is NOT NULL, which keyset seeks rely on
+TENDER_SORT_COLUMNS = {
+    "id": Tender.id,
+    "client": Tender.client,
+    "award_date": Tender.award_date,
+    "product_count": TENDER_PRODUCT_COUNT,
+    "total_margin": TENDER_TOTAL_MARGIN,
+}
+PRODUCT_SORT_COLUMNS = {
+    "id": Product.id,
+    "name": Product.name,
+    "sku": Product.sku,
+    "unit_sale_price": Product.unit_sale_price,
+    "unit_cost": Product.unit_cost,
+}
+ORDER_SORT_COLUMNS = {
+    "id": Order.id,
+    "tender_id": Order.tender_id,
+    "product_id": Order.product_id,
+    "awarded_quantity": Order.awarded_quantity,
+}
+
+def tender_filters(
+    client: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    min_margin: Optional[float] = None,
+    max_margin: Optional[float] = None,
+) -> list:
+    """Criteria for the tender summary listing; margins apply to the tender's total margin"""
+    criteria = date_filters(Tender.award_date, start_date, end_date)
+    if client is not None:
+        criteria.append(Tender.client == client)
+    if min_margin is not None:
+        criteria.append(TENDER_TOTAL_MARGIN >= min_margin)
+    if max_margin is not None:
+        criteria.append(TENDER_TOTAL_MARGIN <= max_margin)
+    return criteria
+
+def product_filters(sku: Optional[str] = None) -> list:
+    return [Product.sku == sku] if sku is not None else []
+
+def order_filters(tender_id: Optional[int] = None, product_id: Optional[int] = None, sku: Optional[str] = None) -> list:
+    criteria = []
+    if tender_id is not None:
+        criteria.append(Order.tender_id == tender_id)
+    if product_id is not None:
+        criteria.append(Order.product_id == product_id)
+    if sku is not None:
+        # Resolved through the unique SKU index instead of joining products
+        criteria.append(Order.product_id == select(Product.id).where(Product.sku == sku).scalar_subquery())
+    return criteria
+
+def calculate_margin(product: Product, quantity: int) -> Decimal:
+    """Calculate margin for a product order, exactly in Decimal"""
     return (product.unit_sale_price - product.unit_cost) * quantity
 
+# Count and existence queries: SELECT count(*) / EXISTS without loading rows
+def count_rows(db: Session, model, *criteria) -> int:
+    return db.query(func.count()).select_from(model).filter(*criteria).scalar()
+
+def rows_exist(db: Session, model, *criteria) -> bool:
+    return db.query(db.query(model).filter(*criteria).exists()).scalar()
+
+def count_tenders(db: Session, **filters) -> int:
+    criteria = tender_filters(**filters)
+    if not criteria:
+        return count_rows(db, Tender)
+    return (
+        db.query(func.count())
+        .select_from(Tender)
+        .outerjoin(TenderMargin, TenderMargin.tender_id == Tender.id)
+        .filter(*criteria)
+        .scalar()
+    )
+
+def count_products(db: Session, **filters) -> int:
+    return count_rows(db, Product, *product_filters(**filters))
+
+def count_orders(db: Session, **filters) -> int:
+    return count_rows(db, Order, *order_filters(**filters))
+
+def tender_has_orders(db: Session, tender_id: int) -> bool:
+    return rows_exist(db, Order, Order.tender_id == tender_id)
+
 # Tender CRUD operations
 def get_tender(db: Session, tender_id: int):
     return db.query(Tender).filter(Tender.id == tender_id).first()
 
-def get_tenders(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Tender).offset(skip).limit(limit).all()
+def get_tenders(db: Session, skip: int = 0, limit: int = 100, after: Optional[Cursor] = None):
+    return paginate(db.query(Tender), Tender.id, skip, limit, after).all()
 
 def create_tender(db: Session, tender: schemas.TenderCreate):
     db_tender = Tender(**tender.dict())
+    db_tender.margin_rollup = TenderMargin()
     db.add(db_tender)
     db.commit()
     db.refresh(db_tender)
     return db_tender
 
+def create_tenders_bulk(db: Session, tenders: List[schemas.TenderCreate]):
+    """Create many tenders in one transaction"""
+    if not tenders:
+        return []
+    created = db.scalars(
+        insert(Tender).returning(Tender),
+        [tender.dict() for tender in tenders]
+    ).all()
+    # Tenders start without orders, so their rollup rows start at zero
+    db.execute(insert(TenderMargin), [{"tender_id": tender.id} for tender in created])
+    created = [schemas.Tender.from_orm(tender) for tender in created]
+    db.commit()
+    return created
+
+def _lock_tender_products(db: Session, tender_id: int):
+    """Share-lock the products of a tender's orders, which its rollup deltas are priced from"""
+    db.execute(
+        select(Product.id)
+        .where(Product.id.in_(select(Order.product_id).where(Order.tender_id == tender_id)))
+        .order_by(Product.id)
+        .with_for_update(read=True)
+    )
+
 def update_tender(db: Session, tender_id: int, tender_update: schemas.TenderUpdate):
-    db_tender = db.query(Tender).filter(Tender.id == tender_id).first()
+    # Locked so order writes on the tender wait for its daily rollup buckets to move
+    row = (
+        db.query(Tender, rollups.award_day())
+        .filter(Tender.id == tender_id)
+        .with_for_update(key_share=True, of=Tender)
+        .first()
+    )
+    db_tender = row[0] if row else None
     if db_tender:
         update_data = tender_update.dict(exclude_unset=True)
+        # Moving a tender to another client or day moves its orders between daily rollup buckets
+        bucket = (row[1], db_tender.client)
         for field, value in update_data.items():
             setattr(db_tender, field, value)
+        if "client" in update_data or "award_date" in update_data:
+            _lock_tender_products(db, tender_id)
+            db.flush()
+            rollups.apply_deltas(db, union_all(
+                rollups.order_deltas(Order.tender_id == tender_id, sign=-1, bucket=bucket),
+                rollups.order_deltas(Order.tender_id == tender_id),
+            ), tenders=False)
+        # Snapshot before commit expires it, or it is reloaded with its own query
+        db_tender = schemas.Tender.from_orm(db_tender)
         db.commit()
-        db.refresh(db_tender)
     return db_tender
 
 def delete_tender(db: Session, tender_id: int):
-    db_tender = db.query(Tender).filter(Tender.id == tender_id).first()
+    # Orders first, as order writes lock their row before the tender
+    db.execute(select(Order.id).where(Order.tender_id == tender_id).order_by(Order.id).with_for_update())
+    db_tender = db.query(Tender).filter(Tender.id == tender_id).with_for_update().first()
     if db_tender:
-        db.delete(db_tender)
+        _lock_tender_products(db, tender_id)
+        rollups.apply_deltas(db, rollups.order_deltas(Order.tender_id == tender_id, sign=-1), tenders=False)
+        db.query(Order).filter(Order.tender_id == tender_id).delete(synchronize_session=False)
+        db.query(TenderMargin).filter(TenderMargin.tender_id == tender_id).delete(synchronize_session=False)
+        # A query delete, as the orders and rollup row the session would cascade to are already gone
+        db.query(Tender).filter(Tender.id == tender_id).delete(synchronize_session=False)
         db.commit()
     return db_tender
 
@@ -46,140 +232,366 @@ def get_product(db: Session, product_id: int):
 def get_product_by_sku(db: Session, sku: str):
     return db.query(Product).filter(Product.sku == sku).first()
 
-def get_products(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Product).offset(skip).limit(limit).all()
+def get_products(db: Session, skip: int = 0, limit: int = 100, after: Optional[Cursor] = None, sort=(), **filters):
+    query = db.query(Product).filter(*product_filters(**filters))
+    return paginate(query, Product.id, skip, limit, after, sort_keys(PRODUCT_SORT_COLUMNS, sort, Product.id)).all()
+
+def _product_data(product: Optional[Product]):
+    return schemas.Product.from_orm(product).dict() if product is not None else None
+
+def products_version(db: Session) -> int:
+    """The products table's write counter (see etags.py)"""
+    return db.query(TableVersion.version).filter(TableVersion.table_name == "products").scalar() or 0
+
+# Cached reads return schemas.Product snapshots rather than ORM objects. Keys
+# embed the products table version, which every worker reads from the
+# database, so a write made through any worker misses every worker's cache.
+# Callers that already read the version for an ETag pass it in.
+def get_product_cached(db: Session, product_id: int, version: Optional[int] = None):
+    if version is None:
+        version = products_version(db)
+    data = product_cache.get_or_load(("id", version, product_id), lambda: _product_data(get_product(db, product_id)))
+    return schemas.Product.construct(**data) if data is not None else None
+
+def get_product_by_sku_cached(db: Session, sku: str, version: Optional[int] = None):
+    if version is None:
+        version = products_version(db)
+    data = product_cache.get_or_load(("sku", version, sku), lambda: _product_data(get_product_by_sku(db, sku)))
+    return schemas.Product.construct(**data) if data is not None else None
+
+def get_product_rows_cached(db: Session, skip: int = 0, limit: int = 100, after: Optional[Cursor] = None, sort=(), sku: Optional[str] = None, version: Optional[int] = None):
+    """A page of products as response-ready dicts"""
+    if version is None:
+        version = products_version(db)
+    order = ",".join(("-" if descending else "") + field for field, descending in sort)
+    return product_cache.get_or_load(
+        ("page", version, skip, limit, after, order, sku),
+        lambda: [_product_data(product) for product in get_products(db, skip, limit, after, sort, sku=sku)]
+    )
+
+def get_products_cached(db: Session, skip: int = 0, limit: int = 100, after: Optional[Cursor] = None, sort=(), sku: Optional[str] = None, version: Optional[int] = None):
+    return [schemas.Product.construct(**product) for product in get_product_rows_cached(db, skip, limit, after, sort, sku, version)]
 
 def create_product(db: Session, product: schemas.ProductCreate):
     db_product = Product(**product.dict())
     db.add(db_product)
     db.commit()
+    product_cache.invalidate()
     db.refresh(db_product)
     return db_product
 
+def _price_changes(old_prices, new_prices) -> dict:
+    """Per-unit (sale price, cost) changes of products, by id, for rollups.price_deltas"""
+    changes = {}
+    for product_id, (sale_price, cost) in new_prices.items():
+        old_sale_price, old_cost = old_prices[product_id]
+        # New prices are stored rounded to the cent
+        change = (to_decimal(sale_price) - old_sale_price, to_decimal(cost) - old_cost)
+        if any(change):
+            changes[product_id] = change
+    return changes
+
 def update_product(db: Session, product_id: int, product_update: schemas.ProductUpdate):
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+    # Locked so its old prices stay current until the rollup deltas are applied;
+    # NO KEY UPDATE still lets rollup rows referencing the product be written
+    db_product = db.query(Product).filter(Product.id == product_id).with_for_update(key_share=True).first()
     if db_product:
         update_data = product_update.dict(exclude_unset=True)
+        sale_price = update_data.get("unit_sale_price", db_product.unit_sale_price)
+        cost = update_data.get("unit_cost", db_product.unit_cost)
+        # Compare at cent precision, as the prices will be stored
+        if to_decimal(sale_price) <= to_decimal(cost):
+            raise ValueError("Sale price must be greater than cost")
+        changes = _price_changes(
+            {product_id: (db_product.unit_sale_price, db_product.unit_cost)}, {product_id: (sale_price, cost)}
+        )
         for field, value in update_data.items():
             setattr(db_product, field, value)
+        if changes:
+            db.flush()
+            rollups.apply_deltas(db, rollups.price_deltas(changes))
         db.commit()
+        product_cache.invalidate()
         db.refresh(db_product)
     return db_product
 
+def upsert_products_bulk(db: Session, products: List[schemas.ProductCreate], batch_size: int = 1000):
+    """Insert or update products matched on SKU, returning (inserted, updated) counts"""
+    # A statement may touch each SKU only once, so the last row for a SKU wins.
+    # Rows go in SKU order so concurrent upserts lock the same rows in the same
+    # order instead of deadlocking on each other
+    rows = sorted({product.sku: product.dict() for product in products}.values(), key=lambda row: row["sku"])
+    dialect = db.get_bind().dialect.name
+    inserted = updated = 0
+    
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        skus = [row["sku"] for row in batch]
+        # Locked, in id order, so their old prices stay current until the rollup deltas are applied
+        existing = {
+            product.sku: product
+            for product in db.query(Product.id, Product.sku, Product.unit_sale_price, Product.unit_cost)
+            .filter(Product.sku.in_(skus))
+            .order_by(Product.id)
+            .with_for_update(key_share=True)
+        }
+        updated += len(existing)
+        inserted += len(batch) - len(existing)
+        
+        if dialect in ("postgresql", "sqlite"):
+            dialect_insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+            stmt = dialect_insert(Product).values(batch)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Product.sku],
+                set_={field: stmt.excluded[field] for field in PRODUCT_UPSERT_FIELDS}
+            )
+            db.execute(stmt)
+        else:
+            for row in batch:
+                if row["sku"] in existing:
+                    db.query(Product).filter(Product.sku == row["sku"]).update(
+                        {field: row[field] for field in PRODUCT_UPSERT_FIELDS},
+                        synchronize_session=False
+                    )
+                else:
+                    db.add(Product(**row))
+            db.flush()
+        # Updated rows may have new prices; reprice the orders of those
+        changes = _price_changes(
+            {product.id: (product.unit_sale_price, product.unit_cost) for product in existing.values()},
+            {existing[row["sku"]].id: (row["unit_sale_price"], row["unit_cost"]) for row in batch if row["sku"] in existing},
+        )
+        if changes:
+            rollups.apply_deltas(db, rollups.price_deltas(changes))
+    
+    db.commit()
+    product_cache.invalidate()
+    return inserted, updated
+
 def delete_product(db: Session, product_id: int):
     db_product = db.query(Product).filter(Product.id == product_id).first()
     if db_product:
         db.delete(db_product)
         db.commit()
+        product_cache.invalidate()
     return db_product
 
 # Order CRUD operations
 def get_order(db: Session, order_id: int):
     return db.query(Order).filter(Order.id == order_id).first()
 
-def get_orders(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Order).offset(skip).limit(limit).all()
+def get_orders(db: Session, skip: int = 0, limit: int = 100, after: Optional[Cursor] = None, sort=(), **filters):
+    query = db.query(Order).filter(*order_filters(**filters))
+    return paginate(query, Order.id, skip, limit, after, sort_keys(ORDER_SORT_COLUMNS, sort, Order.id)).all()
+
+def get_order_rows(db: Session, skip: int = 0, limit: int = 100, after: Optional[Cursor] = None, sort=(), **filters):
+    """A page of orders as response-ready dicts"""
+    query = db.query(*[getattr(Order, field) for field in ORDER_FIELDS]).filter(*order_filters(**filters))
+    keys = sort_keys(ORDER_SORT_COLUMNS, sort, Order.id)
+    return [row._asdict() for row in paginate(query, Order.id, skip, limit, after, keys)]
 
 def get_orders_by_tender(db: Session, tender_id: int):
     return db.query(Order).filter(Order.tender_id == tender_id).all()
 
+def _lock_order_references(db: Session, tender_ids, product_ids) -> Tuple[set, set]:
+    """Share-lock the tenders and products order lines refer to, returning the ids that exist
+
+    Rollup deltas are bucketed and priced from these rows (see rollups.py), so
+    they must not change until the order write commits. Rows are locked in id
+    order, tenders before products.
+    """
+    tender_ids, product_ids = set(tender_ids), set(product_ids)
+    tenders = {
+        tender_id
+        for (tender_id,) in db.query(Tender.id).filter(Tender.id.in_(tender_ids)).order_by(Tender.id).with_for_update(read=True)
+    } if tender_ids else set()
+    products = {
+        product_id
+        for (product_id,) in db.query(Product.id).filter(Product.id.in_(product_ids)).order_by(Product.id).with_for_update(read=True)
+    } if product_ids else set()
+    return tenders, products
+
 def create_order(db: Session, order: schemas.OrderCreate):
     # Validate that tender and product exist
-    tender = get_tender(db, order.tender_id)
-    product = get_product(db, order.product_id)
+    tenders, products = _lock_order_references(db, [order.tender_id], [order.product_id])
     
-    if not tender:
+    if order.tender_id not in tenders:
         raise ValueError("Tender not found")
-    if not product:
+    if order.product_id not in products:
         raise ValueError("Product not found")
     
     db_order = Order(**order.dict())
     db.add(db_order)
+    db.flush()
+    rollups.apply_deltas(db, rollups.line_deltas([(order.tender_id, order.product_id, order.awarded_quantity, 1)]))
+    # Snapshot before commit expires it, or it is reloaded with its own query
+    created = schemas.Order.from_orm(db_order)
     db.commit()
-    db.refresh(db_order)
-    return db_order
+    return created
+
+def create_orders_bulk(db: Session, orders: List[schemas.OrderCreate], batch_size: int = 1000):
+    """Create many orders in one transaction, collecting per-row reference errors"""
+    # One IN lookup per referenced table instead of two queries per order
+    existing_tenders, existing_products = _lock_order_references(
+        db, {order.tender_id for order in orders}, {order.product_id for order in orders}
+    )
+    
+    rows = []
+    errors = []
+    for index, order in enumerate(orders):
+        if order.tender_id not in existing_tenders:
+            errors.append(schemas.BulkRowError(index=index, detail="Tender not found"))
+        elif order.product_id not in existing_products:
+            errors.append(schemas.BulkRowError(index=index, detail="Product not found"))
+        else:
+            rows.append(order.dict())
+    
+    created = []
+    if rows:
+        created = db.scalars(
+            insert(Order).returning(Order),
+            rows
+        ).all()
+        ids = [order.id for order in created]
+        for start in range(0, len(ids), batch_size):
+            rollups.apply_deltas(db, rollups.order_deltas(Order.id.in_(ids[start:start + batch_size])))
+        # Snapshot before commit expires them, or each one is reloaded with its own query
+        created = [schemas.Order.from_orm(order) for order in created]
+        db.commit()
+    return created, errors
 
 def update_order(db: Session, order_id: int, order_update: schemas.OrderUpdate):
-    db_order = db.query(Order).filter(Order.id == order_id).first()
+    # Locked so a concurrent update or delete cannot apply its rollup delta from the same old line
+    db_order = db.query(Order).filter(Order.id == order_id).with_for_update().first()
     if db_order:
+        previous = (db_order.tender_id, db_order.product_id, db_order.awarded_quantity, -1)
         update_data = order_update.dict(exclude_unset=True)
+        tender_id = update_data.get("tender_id", db_order.tender_id)
+        product_id = update_data.get("product_id", db_order.product_id)
+        tenders, products = _lock_order_references(db, {db_order.tender_id, tender_id}, {db_order.product_id, product_id})
+        if tender_id not in tenders:
+            raise ValueError("Tender not found")
+        if product_id not in products:
+            raise ValueError("Product not found")
         for field, value in update_data.items():
             setattr(db_order, field, value)
+        db.flush()
+        rollups.apply_deltas(db, rollups.line_deltas([
+            previous, (db_order.tender_id, db_order.product_id, db_order.awarded_quantity, 1)
+        ]))
+        # Snapshot before commit expires it, or it is reloaded with its own query
+        db_order = schemas.Order.from_orm(db_order)
         db.commit()
-        db.refresh(db_order)
     return db_order
 
 def delete_order(db: Session, order_id: int):
-    db_order = db.query(Order).filter(Order.id == order_id).first()
+    db_order = db.query(Order).filter(Order.id == order_id).with_for_update().first()
     if db_order:
+        _lock_order_references(db, [db_order.tender_id], [db_order.product_id])
         db.delete(db_order)
+        db.flush()
+        rollups.apply_deltas(db, rollups.line_deltas([
+            (db_order.tender_id, db_order.product_id, db_order.awarded_quantity, -1)
+        ]))
         db.commit()
     return db_order
 
 # Business logic functions
-def get_tender_with_details(db: Session, tender_id: int):
-    """Get tender with all orders and calculated margins"""
-    tender = get_tender(db, tender_id)
-    if not tender:
-        return None
-    
-    orders = get_orders_by_tender(db, tender_id)
-    orders_with_details = []
-    total_margin = 0
+def get_tender_details_data(db: Session, tender_id: int):
+    """A tender with its orders, their products and margins, as response-ready dicts"""
+    return get_tenders_details_data(db, [tender_id]).get(tender_id)
+
+def get_tenders_details_data(db: Session, tender_ids: Sequence[int]) -> dict:
+    """Detailed views of several tenders keyed by id, in two queries however many are asked for
+
+    Ids that do not exist are left out of the result.
+    """
+    tenders = (
+        db.query(*[getattr(Tender, field) for field in TENDER_FIELDS])
+        .filter(Tender.id.in_(tender_ids))
+        .order_by(Tender.id)
+    )
+    details = {}
+    for tender in tenders:
+        details[tender.id] = tender._asdict()
+        details[tender.id]["orders"] = []
+        details[tender.id]["total_margin"] = ZERO
+    if not details:
+        return {}
     
-    for order in orders:
-        product = get_product(db, order.product_id)
-        margin = calculate_margin(product, order.awarded_quantity)
-        total_margin += margin
-        
-        order_detail = schemas.OrderWithDetails(
-            id=order.id,
-            tender_id=order.tender_id,
-            product_id=order.product_id,
-            awarded_quantity=order.awarded_quantity,
-            product=product,
-            margin=margin
+    rows = (
+        db.query(
+            *[getattr(Order, field) for field in ORDER_FIELDS],
+            *[getattr(Product, field).label(f"product_{field}") for field in PRODUCT_FIELDS],
         )
-        orders_with_details.append(order_detail)
+        .join(Product, Order.product_id == Product.id)
+        .filter(Order.tender_id.in_(list(details)))
+        .order_by(Order.tender_id, Order.id)
+    )
+    for row in rows:
+        order = {field: getattr(row, field) for field in ORDER_FIELDS}
+        order["product"] = {field: getattr(row, f"product_{field}") for field in PRODUCT_FIELDS}
+        order["margin"] = (row.product_unit_sale_price - row.product_unit_cost) * row.awarded_quantity
+        tender = details[row.tender_id]
+        tender["total_margin"] += order["margin"]
+        tender["orders"].append(order)
     
-    return schemas.TenderWithDetails(
-        id=tender.id,
-        client=tender.client,
-        award_date=tender.award_date,
-        description=tender.description,
-        orders=orders_with_details,
-        total_margin=total_margin
+    # Requested order, so the map reads the way the client asked for it
+    return {tender_id: details[tender_id] for tender_id in dict.fromkeys(tender_ids) if tender_id in details}
+
+def tender_summary_query(db: Session):
+    """Query yielding one row per tender with its product count and total margin"""
+    # Totals come from the materialized rollup maintained by rollups.py
+    return (
+        db.query(
+            Tender.id,
+            Tender.client,
+            Tender.award_date,
+            Tender.description,
+            TENDER_PRODUCT_COUNT.label("product_count"),
+            TENDER_TOTAL_MARGIN.label("total_margin"),
+        )
+        .outerjoin(TenderMargin, TenderMargin.tender_id == Tender.id)
     )
 
-def get_tenders_summary(db: Session, skip: int = 0, limit: int = 100):
+def get_tender_summary_rows(db: Session, skip: int = 0, limit: int = 100, after: Optional[Cursor] = None, sort=(), **filters):
+    """A page of tender summaries as response-ready dicts"""
+    query = tender_summary_query(db).filter(*tender_filters(**filters))
+    keys = sort_keys(TENDER_SORT_COLUMNS, sort, Tender.id)
+    return [row._asdict() for row in paginate(query, Tender.id, skip, limit, after, keys)]
+
+def get_tenders_summary(db: Session, skip: int = 0, limit: int = 100, after: Optional[Cursor] = None, sort=(), **filters):
     """Get summary of all tenders with margin calculations"""
-    tenders = get_tenders(db, skip, limit)
-    summaries = []
-    
-    for tender in tenders:
-        orders = get_orders_by_tender(db, tender.id)
-        total_margin = 0
-        product_count = len(orders)
-        
-        for order in orders:
-            product = get_product(db, order.product_id)
-            margin = calculate_margin(product, order.awarded_quantity)
-            total_margin += margin
-        
-        summary = schemas.TenderSummary(
-            id=tender.id,
-            client=tender.client,
-            award_date=tender.award_date,
-            description=tender.description,
-            product_count=product_count,
-            total_margin=total_margin
+    return [schemas.TenderSummary(**row) for row in get_tender_summary_rows(db, skip, limit, after, sort, **filters)]
+
+def iter_tenders_summary(db: Session, batch_size: int = 1000):
+    """Stream every tender summary through a server-side cursor"""
+    query = tender_summary_query(db).order_by(Tender.id).yield_per(batch_size)
+    for row in query:
+        yield row._asdict()
+
+def iter_orders_with_margin(db: Session, batch_size: int = 1000):
+    """Stream every order with its product pricing and margin through a server-side cursor"""
+    query = (
+        db.query(
+            Order.id,
+            Order.tender_id,
+            Order.product_id,
+            Product.sku,
+            Order.awarded_quantity,
+            Product.unit_sale_price,
+            Product.unit_cost,
         )
-        summaries.append(summary)
-    
-    return summaries
+        .join(Product, Order.product_id == Product.id)
+        .order_by(Order.id)
+        .yield_per(batch_size)
+    )
+    for row in query:
+        order = row._asdict()
+        order["margin"] = calculate_margin(row, row.awarded_quantity)
+        yield order
 
 def validate_tender_registration(db: Session, tender_id: int):
     """Validate that tender has at least one product"""
-    orders = get_orders_by_tender(db, tender_id)
-    if not orders:
+    if not tender_has_orders(db, tender_id):
         raise ValueError("No tender registration without products")
@@ -0,0 +1,67 @@
+"""Awaitable counterparts of the functions in crud.py.
+
+With DATABASE_ASYNC enabled the session is an AsyncSession and each call
+runs the CRUD function through ``run_sync`` on the event loop, so no worker
+thread is blocked on the database. With a regular Session the call is
+dispatched to the threadpool, matching the previous sync handlers.
+"""
+import functools
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud
+
+async def run(db, fn, *args, **kwargs):
+    """Run a sync CRUD function against either kind of session"""
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+def _awaitable(fn):
+    @functools.wraps(fn)
+    async def wrapper(db, *args, **kwargs):
+        return await run(db, fn, *args, **kwargs)
+    return wrapper
+
+# Count and existence queries
+count_tenders = _awaitable(crud.count_tenders)
+count_products = _awaitable(crud.count_products)
+count_orders = _awaitable(crud.count_orders)
+tender_has_orders = _awaitable(crud.tender_has_orders)
+
+# Tender operations
+get_tender = _awaitable(crud.get_tender)
+get_tenders = _awaitable(crud.get_tenders)
+create_tender = _awaitable(crud.create_tender)
+create_tenders_bulk = _awaitable(crud.create_tenders_bulk)
+update_tender = _awaitable(crud.update_tender)
+delete_tender = _awaitable(crud.delete_tender)
+
+# Product operations
+get_product = _awaitable(crud.get_product)
+get_product_by_sku = _awaitable(crud.get_product_by_sku)
+get_products = _awaitable(crud.get_products)
+get_product_cached = _awaitable(crud.get_product_cached)
+get_product_by_sku_cached = _awaitable(crud.get_product_by_sku_cached)
+get_products_cached = _awaitable(crud.get_products_cached)
+get_product_rows_cached = _awaitable(crud.get_product_rows_cached)
+create_product = _awaitable(crud.create_product)
+update_product = _awaitable(crud.update_product)
+upsert_products_bulk = _awaitable(crud.upsert_products_bulk)
+delete_product = _awaitable(crud.delete_product)
+
+# Order operations
+get_order = _awaitable(crud.get_order)
+get_orders = _awaitable(crud.get_orders)
+get_order_rows = _awaitable(crud.get_order_rows)
+get_orders_by_tender = _awaitable(crud.get_orders_by_tender)
+create_order = _awaitable(crud.create_order)
+create_orders_bulk = _awaitable(crud.create_orders_bulk)
+update_order = _awaitable(crud.update_order)
+delete_order = _awaitable(crud.delete_order)
+
+# Business logic
+get_tender_details_data = _awaitable(crud.get_tender_details_data)
+get_tenders_details_data = _awaitable(crud.get_tenders_details_data)
+get_tenders_summary = _awaitable(crud.get_tenders_summary)
+get_tender_summary_rows = _awaitable(crud.get_tender_summary_rows)
+validate_tender_registration = _awaitable(crud.validate_tender_registration)
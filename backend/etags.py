@@ -0,0 +1,46 @@
+"""Conditional GET support for the read endpoints.
+
+A response's ETag is derived from the request URL and the write version of
+every table the response depends on (database.TableVersion), so checking
+If-None-Match costs a single primary key lookup instead of the full query.
+"""
+import hashlib
+from typing import Iterable, Optional
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+from database import TableVersion
+import crud_async
+
+CACHE_CONTROL = "private, no-cache"
+
+def read_versions(db: Session, tables: Iterable[str]) -> dict:
+    rows = db.query(TableVersion.table_name, TableVersion.version).filter(TableVersion.table_name.in_(list(tables)))
+    return dict(rows.all())
+
+def compute_etag(request: Request, versions: dict) -> str:
+    state = "|".join(f"{name}={versions.get(name, 0)}" for name in sorted(versions))
+    digest = hashlib.sha1(f"{request.url.path}?{request.url.query}|{state}".encode()).hexdigest()
+    return f'"{digest}"'
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses weak comparison
+    return "*" in candidates or etag in [candidate.removeprefix("W/") for candidate in candidates]
+
+async def conditional_get(request: Request, response: Response, db, tables: Iterable[str]) -> Optional[Response]:
+    """Answer 304 when the client's copy is current; otherwise tag the response
+
+    The versions read are left in ``request.state.table_versions`` so the
+    handler can key caches on them without reading them again.
+    """
+    tables = list(tables)
+    versions = await crud_async.run(db, read_versions, tables)
+    request.state.table_versions = versions
+    etag = compute_etag(request, {name: versions.get(name, 0) for name in tables})
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, Iterator, List
+
+# Column order for the streamed exports
+ORDER_EXPORT_FIELDS = [
+    "id", "tender_id", "product_id", "sku", "awarded_quantity",
+    "unit_sale_price", "unit_cost", "margin",
+]
+TENDER_EXPORT_FIELDS = [
+    "id", "client", "award_date", "description", "product_count", "total_margin",
+]
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def stream_ndjson(rows: Iterable[dict], chunk_size: int = 500) -> Iterator[str]:
+    """Serialize rows as newline-delimited JSON, flushing in chunks"""
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps({key: _encode_value(value) for key, value in row.items()}))
+        if len(chunk) >= chunk_size:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+def stream_csv(rows: Iterable[dict], fields: List[str], chunk_size: int = 500) -> Iterator[str]:
+    """Serialize rows as CSV with a header line, flushing in chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    pending = 0
+    for row in rows:
+        writer.writerow([_encode_value(row[field]) for field in fields])
+        pending += 1
+        if pending >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    yield buffer.getvalue()
+
+def stream_export(rows: Iterable[dict], fields: List[str], export_format: str) -> Iterator[str]:
+    if export_format == "csv":
+        return stream_csv(rows, fields)
+    return stream_ndjson(rows)
@@ -1,11 +1,28 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, Dict, List, Optional
+from datetime import date
+from pydantic import ValidationError
+import analytics
 import crud
+import crud_async
 import schemas
-from database import get_db
-from seed_data import seed_database
+import search
+import simulator
+from database import DbSession, get_db, get_session
+from pagination import decode_cursor, parse_ids, parse_sort, set_next_cursor, set_total_count
+from serialization import json_response
+from etags import conditional_get
+from exports import stream_export, EXPORT_MEDIA_TYPES, ORDER_EXPORT_FIELDS, TENDER_EXPORT_FIELDS
+from pool_metrics import pool_stats
+from product_cache import product_cache
+import request_metrics
+from request_metrics import RequestMetricsMiddleware
+import seed_data
 import asyncio
 import os
 
@@ -34,91 +51,258 @@ if os.getenv("ENVIRONMENT") == "production":
         "https://*.netlify.app"
     ])
 
+app.add_middleware(RequestMetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag"],
 )
 
+# Tables each cached read endpoint depends on (see etags.py)
+TENDER_SUMMARY_TABLES = ("tenders", "orders", "products", "tender_margins")
+TIMESERIES_TABLES = ("daily_margins", "day_margins", "products")
+TENDER_DETAIL_TABLES = ("tenders", "orders", "products")
+# Filtering orders by SKU reads products as well
+ORDER_LIST_TABLES = ("orders", "products")
+
+# Seeding runs in the background; set SEED_ON_STARTUP=false to seed with a separate
+# `python seed_data.py` job instead
+SEED_ON_STARTUP = os.getenv("SEED_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
 # Startup event to seed database
 @app.on_event("startup")
 async def startup_event():
-    await seed_database()
+    if SEED_ON_STARTUP:
+        seed_data.start_background_seeding()
+    else:
+        seed_data.seed_status["state"] = "disabled"
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await seed_data.stop_background_seeding()
 
 # Health check
 @app.get("/health")
 def health_check():
+    """Liveness: the process is up and serving"""
     return {"status": "healthy"}
 
+# Seeding states after which the app serves its data; a failed seed keeps the
+# pod out of rotation and is reported as its own status
+READY_SEED_STATES = ("completed", "disabled")
+
+@app.get("/ready")
+async def readiness_check(db: DbSession = Depends(get_session)):
+    """Readiness: the database answers and startup seeding has finished"""
+    seeding = dict(seed_data.seed_status)
+    try:
+        await crud_async.run(db, lambda session: session.execute(text("SELECT 1")))
+        database_ok = True
+    except Exception:
+        database_ok = False
+    
+    ready = database_ok and seeding["state"] in READY_SEED_STATES
+    if ready:
+        readiness = "ready"
+    elif seeding["state"] == "failed":
+        readiness = "seeding_failed"
+    else:
+        readiness = "not_ready"
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=jsonable_encoder({"status": readiness, "database": database_ok, "seeding": seeding}),
+    )
+
+@app.get("/health/cache")
+def cache_health():
+    """Report product catalog cache hit/miss counters"""
+    return {"products": product_cache.stats()}
+
+@app.get("/health/pool")
+def pool_health():
+    """Report connection pool usage and checkout wait statistics"""
+    return {"pools": pool_stats()}
+
+@app.get("/health/requests")
+def request_health():
+    """Report per-route request counts, query counts, DB time and slowest statements"""
+    return {"routes": request_metrics.registry.snapshot()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics: per-route request latency and SQL query count histograms"""
+    return PlainTextResponse(request_metrics.registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # Tender endpoints
 @app.get("/tenders/", response_model=List[schemas.TenderSummary])
-def read_tenders_summary(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get summary of all tenders with margin calculations"""
-    return crud.get_tenders_summary(db, skip=skip, limit=limit)
+async def read_tenders_summary(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = None,
+    include_total: bool = False,
+    client: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    min_margin: Optional[float] = None,
+    max_margin: Optional[float] = None,
+    sort: Optional[str] = Query(None, description="Comma-separated fields, '-' prefix for descending, e.g. -total_margin,client"),
+    db: DbSession = Depends(get_session)
+):
+    """Get summary of all tenders with margin calculations, filtered and sorted in SQL"""
+    sort_terms = parse_sort(sort, crud.TENDER_SORT_COLUMNS)
+    not_modified = await conditional_get(request, response, db, TENDER_SUMMARY_TABLES)
+    if not_modified:
+        return not_modified
+    filters = dict(client=client, start_date=start_date, end_date=end_date, min_margin=min_margin, max_margin=max_margin)
+    summaries = await crud_async.get_tender_summary_rows(
+        db, skip=skip, limit=limit, after=decode_cursor(after, sort_terms, crud.TENDER_SORT_COLUMNS), sort=sort_terms, **filters
+    )
+    set_next_cursor(response, summaries, limit, sort_terms)
+    if include_total:
+        set_total_count(response, await crud_async.count_tenders(db, **filters))
+    return json_response(response, summaries)
+
+@app.get("/tenders/export")
+def export_tenders(format: str = Query("ndjson", regex="^(ndjson|csv)$"), db: Session = Depends(get_db)):
+    """Stream every tender summary with its margin as NDJSON or CSV"""
+    rows = crud.iter_tenders_summary(db)
+    return StreamingResponse(
+        stream_export(rows, TENDER_EXPORT_FIELDS, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=tenders.{format}"},
+    )
+
+# Declared before /tenders/{tender_id} so "details" is not read as a tender id
+@app.get("/tenders/details", response_model=Dict[int, schemas.TenderWithDetails])
+async def read_tenders_details(
+    request: Request,
+    response: Response,
+    ids: str = Query(..., description="Comma-separated tender ids, e.g. 1,2,3"),
+    db: DbSession = Depends(get_session)
+):
+    """Get the detailed views of several tenders keyed by id; unknown ids are left out"""
+    tender_ids = parse_ids(ids, schemas.MAX_TENDER_DETAIL_IDS)
+    not_modified = await conditional_get(request, response, db, TENDER_DETAIL_TABLES)
+    if not_modified:
+        return not_modified
+    return json_response(response, await crud_async.get_tenders_details_data(db, tender_ids))
+
+@app.post("/tenders/details", response_model=Dict[int, schemas.TenderWithDetails])
+async def read_tenders_details_batch(details_request: schemas.TenderDetailsRequest, response: Response, db: DbSession = Depends(get_session)):
+    """Same as GET /tenders/details, for id lists too long for a query string"""
+    tender_ids = list(dict.fromkeys(details_request.ids))
+    return json_response(response, await crud_async.get_tenders_details_data(db, tender_ids))
 
 @app.get("/tenders/{tender_id}", response_model=schemas.TenderWithDetails)
-def read_tender_details(tender_id: int, db: Session = Depends(get_db)):
+async def read_tender_details(request: Request, response: Response, tender_id: int, db: DbSession = Depends(get_session)):
     """Get detailed view of a specific tender with all products and margins"""
-    tender = crud.get_tender_with_details(db, tender_id=tender_id)
+    not_modified = await conditional_get(request, response, db, TENDER_DETAIL_TABLES)
+    if not_modified:
+        return not_modified
+    tender = await crud_async.get_tender_details_data(db, tender_id=tender_id)
     if tender is None:
         raise HTTPException(status_code=404, detail="Tender not found")
-    return tender
+    return json_response(response, tender)
 
 @app.post("/tenders/", response_model=schemas.Tender, status_code=status.HTTP_201_CREATED)
-def create_tender(tender: schemas.TenderCreate, db: Session = Depends(get_db)):
+async def create_tender(tender: schemas.TenderCreate, db: DbSession = Depends(get_session)):
     """Create a new tender"""
-    return crud.create_tender(db=db, tender=tender)
+    return await crud_async.create_tender(db=db, tender=tender)
 
 @app.put("/tenders/{tender_id}", response_model=schemas.Tender)
-def update_tender(tender_id: int, tender_update: schemas.TenderUpdate, db: Session = Depends(get_db)):
+async def update_tender(tender_id: int, tender_update: schemas.TenderUpdate, db: DbSession = Depends(get_session)):
     """Update an existing tender"""
-    db_tender = crud.update_tender(db, tender_id, tender_update)
+    db_tender = await crud_async.update_tender(db, tender_id, tender_update)
     if db_tender is None:
         raise HTTPException(status_code=404, detail="Tender not found")
     return db_tender
 
 @app.delete("/tenders/{tender_id}")
-def delete_tender(tender_id: int, db: Session = Depends(get_db)):
+async def delete_tender(tender_id: int, db: DbSession = Depends(get_session)):
     """Delete a tender"""
-    db_tender = crud.delete_tender(db, tender_id)
+    db_tender = await crud_async.delete_tender(db, tender_id)
     if db_tender is None:
         raise HTTPException(status_code=404, detail="Tender not found")
     return {"message": "Tender deleted successfully"}
 
 # Product endpoints
 @app.get("/products/", response_model=List[schemas.Product])
-def read_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all products"""
-    return crud.get_products(db, skip=skip, limit=limit)
+async def read_products(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = None,
+    include_total: bool = False,
+    sku: Optional[str] = None,
+    sort: Optional[str] = Query(None, description="Comma-separated fields, '-' prefix for descending, e.g. -unit_sale_price,name"),
+    db: DbSession = Depends(get_session)
+):
+    """Get all products, filtered and sorted in SQL"""
+    sort_terms = parse_sort(sort, crud.PRODUCT_SORT_COLUMNS)
+    not_modified = await conditional_get(request, response, db, ("products",))
+    if not_modified:
+        return not_modified
+    products = await crud_async.get_product_rows_cached(
+        db, skip=skip, limit=limit, after=decode_cursor(after, sort_terms, crud.PRODUCT_SORT_COLUMNS), sort=sort_terms, sku=sku,
+        version=request.state.table_versions.get("products", 0)
+    )
+    set_next_cursor(response, products, limit, sort_terms)
+    if include_total:
+        set_total_count(response, await crud_async.count_products(db, sku=sku))
+    return json_response(response, products)
 
 @app.get("/products/{product_id}", response_model=schemas.Product)
-def read_product(product_id: int, db: Session = Depends(get_db)):
+async def read_product(request: Request, response: Response, product_id: int, db: DbSession = Depends(get_session)):
     """Get a specific product"""
-    db_product = crud.get_product(db, product_id=product_id)
+    not_modified = await conditional_get(request, response, db, ("products",))
+    if not_modified:
+        return not_modified
+    db_product = await crud_async.get_product_cached(
+        db, product_id=product_id, version=request.state.table_versions.get("products", 0)
+    )
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     return db_product
 
 @app.post("/products/", response_model=schemas.Product, status_code=status.HTTP_201_CREATED)
-def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
+async def create_product(product: schemas.ProductCreate, db: DbSession = Depends(get_session)):
     """Create a new product"""
     # Check if SKU already exists
-    existing_product = crud.get_product_by_sku(db, product.sku)
+    existing_product = await crud_async.get_product_by_sku_cached(db, product.sku)
     if existing_product:
         raise HTTPException(status_code=400, detail="Product with this SKU already exists")
     
     try:
-        return crud.create_product(db=db, product=product)
+        return await crud_async.create_product(db=db, product=product)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/products/bulk-upsert", response_model=schemas.BulkProductResult)
+async def upsert_products_bulk(products: List[Dict[str, Any]], db: DbSession = Depends(get_session)):
+    """Insert or update many products matched on SKU, reporting invalid rows"""
+    valid_products = []
+    errors = []
+    for index, product_info in enumerate(products):
+        try:
+            valid_products.append(schemas.ProductCreate(**product_info))
+        except ValidationError as e:
+            errors.append(schemas.BulkRowError(index=index, detail=str(e)))
+    
+    inserted, updated = await crud_async.upsert_products_bulk(db=db, products=valid_products)
+    return schemas.BulkProductResult(inserted=inserted, updated=updated, errors=errors)
+
 @app.put("/products/{product_id}", response_model=schemas.Product)
-def update_product(product_id: int, product_update: schemas.ProductUpdate, db: Session = Depends(get_db)):
+async def update_product(product_id: int, product_update: schemas.ProductUpdate, db: DbSession = Depends(get_session)):
     """Update an existing product"""
     try:
-        db_product = crud.update_product(db, product_id, product_update)
+        db_product = await crud_async.update_product(db, product_id, product_update)
         if db_product is None:
             raise HTTPException(status_code=404, detail="Product not found")
         return db_product
@@ -126,40 +310,95 @@ def update_product(product_id: int, product_update: schemas.ProductUpdate, db: S
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/products/{product_id}")
-def delete_product(product_id: int, db: Session = Depends(get_db)):
+async def delete_product(product_id: int, db: DbSession = Depends(get_session)):
     """Delete a product"""
-    db_product = crud.delete_product(db, product_id)
+    db_product = await crud_async.delete_product(db, product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     return {"message": "Product deleted successfully"}
 
 # Order endpoints
 @app.get("/orders/", response_model=List[schemas.Order])
-def read_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all orders"""
-    return crud.get_orders(db, skip=skip, limit=limit)
+async def read_orders(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = None,
+    include_total: bool = False,
+    tender_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    sku: Optional[str] = None,
+    sort: Optional[str] = Query(None, description="Comma-separated fields, '-' prefix for descending, e.g. tender_id,-awarded_quantity"),
+    db: DbSession = Depends(get_session)
+):
+    """Get all orders, filtered and sorted in SQL"""
+    sort_terms = parse_sort(sort, crud.ORDER_SORT_COLUMNS)
+    not_modified = await conditional_get(request, response, db, ORDER_LIST_TABLES if sku is not None else ("orders",))
+    if not_modified:
+        return not_modified
+    filters = dict(tender_id=tender_id, product_id=product_id, sku=sku)
+    orders = await crud_async.get_order_rows(
+        db, skip=skip, limit=limit, after=decode_cursor(after, sort_terms, crud.ORDER_SORT_COLUMNS), sort=sort_terms, **filters
+    )
+    set_next_cursor(response, orders, limit, sort_terms)
+    if include_total:
+        set_total_count(response, await crud_async.count_orders(db, **filters))
+    return json_response(response, orders)
+
+@app.get("/orders/export")
+def export_orders(format: str = Query("ndjson", regex="^(ndjson|csv)$"), db: Session = Depends(get_db)):
+    """Stream every order with its margin as NDJSON or CSV"""
+    rows = crud.iter_orders_with_margin(db)
+    return StreamingResponse(
+        stream_export(rows, ORDER_EXPORT_FIELDS, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=orders.{format}"},
+    )
 
 @app.get("/orders/{order_id}", response_model=schemas.Order)
-def read_order(order_id: int, db: Session = Depends(get_db)):
+async def read_order(request: Request, response: Response, order_id: int, db: DbSession = Depends(get_session)):
     """Get a specific order"""
-    db_order = crud.get_order(db, order_id=order_id)
+    not_modified = await conditional_get(request, response, db, ("orders",))
+    if not_modified:
+        return not_modified
+    db_order = await crud_async.get_order(db, order_id=order_id)
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     return db_order
 
 @app.post("/orders/", response_model=schemas.Order, status_code=status.HTTP_201_CREATED)
-def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db)):
+async def create_order(order: schemas.OrderCreate, db: DbSession = Depends(get_session)):
     """Create a new order"""
     try:
-        return crud.create_order(db=db, order=order)
+        return await crud_async.create_order(db=db, order=order)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/orders/bulk", response_model=schemas.BulkOrderResult)
+async def create_orders_bulk(orders: List[Dict[str, Any]], db: DbSession = Depends(get_session)):
+    """Create many orders in a single transaction, reporting invalid rows and missing references per row"""
+    valid_orders = []
+    positions = []
+    errors = []
+    for index, order_info in enumerate(orders):
+        try:
+            valid_orders.append(schemas.OrderCreate(**order_info))
+            positions.append(index)
+        except ValidationError as e:
+            errors.append(schemas.BulkRowError(index=index, detail=str(e)))
+    
+    created, reference_errors = await crud_async.create_orders_bulk(db=db, orders=valid_orders)
+    # crud numbers rows within the valid ones; report them by their position in the request
+    errors.extend(schemas.BulkRowError(index=positions[error.index], detail=error.detail) for error in reference_errors)
+    errors.sort(key=lambda error: error.index)
+    return schemas.BulkOrderResult(created=created, errors=errors)
+
 @app.put("/orders/{order_id}", response_model=schemas.Order)
-def update_order(order_id: int, order_update: schemas.OrderUpdate, db: Session = Depends(get_db)):
+async def update_order(order_id: int, order_update: schemas.OrderUpdate, db: DbSession = Depends(get_session)):
     """Update an existing order"""
     try:
-        db_order = crud.update_order(db, order_id, order_update)
+        db_order = await crud_async.update_order(db, order_id, order_update)
         if db_order is None:
             raise HTTPException(status_code=404, detail="Order not found")
         return db_order
@@ -167,32 +406,110 @@ def update_order(order_id: int, order_update: schemas.OrderUpdate, db: Session =
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/orders/{order_id}")
-def delete_order(order_id: int, db: Session = Depends(get_db)):
+async def delete_order(order_id: int, db: DbSession = Depends(get_session)):
     """Delete an order"""
-    db_order = crud.delete_order(db, order_id)
+    db_order = await crud_async.delete_order(db, order_id)
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     return {"message": "Order deleted successfully"}
 
+# Analytics endpoints
+@app.get("/analytics/margins", response_model=schemas.MarginAnalytics)
+async def read_margin_analytics(
+    request: Request,
+    response: Response,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    top_n: int = Query(5, ge=1, le=100),
+    group_limit: int = Query(50, ge=1, le=1000),
+    db: DbSession = Depends(get_session)
+):
+    """Margin totals, distribution, percentiles, top tenders and client/product breakdowns"""
+    not_modified = await conditional_get(request, response, db, TENDER_SUMMARY_TABLES)
+    if not_modified:
+        return not_modified
+    return await crud_async.run(
+        db, analytics.get_margin_analytics,
+        start_date=start_date, end_date=end_date, top_n=top_n, group_limit=group_limit
+    )
+
+@app.get("/analytics/margins/timeseries", response_model=schemas.MarginTimeSeries)
+async def read_margin_timeseries(
+    request: Request,
+    response: Response,
+    bucket: str = Query("day", regex="^(day|week|month)$"),
+    split: Optional[str] = Query(None, regex="^(client|product)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: DbSession = Depends(get_session)
+):
+    """Margin, revenue and order counts bucketed by day, week or month, optionally split by client or product"""
+    not_modified = await conditional_get(request, response, db, TIMESERIES_TABLES)
+    if not_modified:
+        return not_modified
+    return await crud_async.run(
+        db, analytics.get_margin_timeseries,
+        bucket=bucket, split=split, start_date=start_date, end_date=end_date
+    )
+
+# Simulation endpoints
+@app.post("/simulate/margins", response_model=schemas.MarginSimulation)
+async def simulate_margins(simulation: schemas.MarginSimulationRequest, db: DbSession = Depends(get_session)):
+    """Per-tender margin deltas for hypothetical per-SKU price and cost changes; nothing is saved"""
+    return await crud_async.run(db, simulator.simulate_margins, simulation)
+
+# Search endpoints
+@app.get("/search/tenders", response_model=List[schemas.TenderSearchResult])
+async def search_tenders(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: DbSession = Depends(get_session)
+):
+    """Tenders whose client or description match every term of q as a prefix, best match first"""
+    not_modified = await conditional_get(request, response, db, ("tenders",))
+    if not_modified:
+        return not_modified
+    return json_response(response, await crud_async.run(db, search.search_tenders, q, skip=skip, limit=limit))
+
+@app.get("/search/products", response_model=List[schemas.ProductSearchResult])
+async def search_products(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: DbSession = Depends(get_session)
+):
+    """Products whose name, description or SKU match q as a prefix; SKU matches rank first"""
+    not_modified = await conditional_get(request, response, db, ("products",))
+    if not_modified:
+        return not_modified
+    return json_response(response, await crud_async.run(db, search.search_products, q, skip=skip, limit=limit))
+
 # Business logic endpoints
 @app.post("/seed-database/")
 async def seed_database_endpoint():
     """Manually trigger database seeding"""
     try:
-        await seed_database()
+        await seed_data.seed_database()
         return {"message": "Database seeded successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error seeding database: {str(e)}")
 
 @app.get("/tenders/{tender_id}/validate")
-def validate_tender(tender_id: int, db: Session = Depends(get_db)):
+async def validate_tender(tender_id: int, db: DbSession = Depends(get_session)):
     """Validate that a tender has at least one product"""
     try:
-        crud.validate_tender_registration(db, tender_id)
+        await crud_async.validate_tender_registration(db, tender_id)
         return {"message": "Tender is valid"}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 if __name__ == "__main__":
     import uvicorn
+    from database import init_db
+    init_db()
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
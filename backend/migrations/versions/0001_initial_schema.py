@@ -0,0 +1,68 @@
+"""Initial schema
+
+Databases created before migrations existed (via create_all on import)
+already have these tables; they are left untouched and only stamped.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    
+    if "tenders" not in existing:
+        op.create_table(
+            "tenders",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("client", sa.String(), nullable=False),
+            sa.Column("award_date", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("description", sa.Text(), nullable=True),
+        )
+        op.create_index("ix_tenders_id", "tenders", ["id"])
+    
+    if "products" not in existing:
+        op.create_table(
+            "products",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("sku", sa.String(), nullable=False),
+            sa.Column("unit_sale_price", sa.Float(), nullable=False),
+            sa.Column("unit_cost", sa.Float(), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+        )
+        op.create_index("ix_products_id", "products", ["id"])
+        op.create_index("ix_products_sku", "products", ["sku"], unique=True)
+    
+    if "orders" not in existing:
+        op.create_table(
+            "orders",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("tender_id", sa.Integer(), sa.ForeignKey("tenders.id"), nullable=False),
+            sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id"), nullable=False),
+            sa.Column("awarded_quantity", sa.Integer(), nullable=False),
+        )
+        op.create_index("ix_orders_id", "orders", ["id"])
+    
+    if "tender_margins" not in existing:
+        op.create_table(
+            "tender_margins",
+            sa.Column("tender_id", sa.Integer(), sa.ForeignKey("tenders.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("order_count", sa.Integer(), nullable=False),
+            sa.Column("total_margin", sa.Float(), nullable=False),
+            sa.Column("total_revenue", sa.Float(), nullable=False),
+            sa.Column("total_cost", sa.Float(), nullable=False),
+        )
+
+def downgrade():
+    op.drop_table("tender_margins")
+    op.drop_table("orders")
+    op.drop_table("products")
+    op.drop_table("tenders")
@@ -0,0 +1,23 @@
+"""Index order foreign keys and tender award dates
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # (tender_id, product_id) also covers lookups on tender_id alone
+    op.create_index("ix_orders_tender_id_product_id", "orders", ["tender_id", "product_id"])
+    op.create_index("ix_orders_product_id", "orders", ["product_id"])
+    op.create_index("ix_tenders_award_date", "tenders", ["award_date"])
+
+def downgrade():
+    op.drop_index("ix_tenders_award_date", table_name="tenders")
+    op.drop_index("ix_orders_product_id", table_name="orders")
+    op.drop_index("ix_orders_tender_id_product_id", table_name="orders")
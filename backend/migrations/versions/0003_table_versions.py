@@ -0,0 +1,27 @@
+"""Per-table version counters for HTTP ETags
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    table_versions = op.create_table(
+        "table_versions",
+        sa.Column("table_name", sa.String(), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+    )
+    op.bulk_insert(table_versions, [
+        {"table_name": name, "version": 0}
+        for name in ["tenders", "products", "orders", "tender_margins"]
+    ])
+
+def downgrade():
+    op.drop_table("table_versions")
@@ -0,0 +1,45 @@
+"""Daily margin rollup per award day, client and product
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "daily_margins",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("client", sa.String(), primary_key=True),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id"), primary_key=True),
+        sa.Column("order_count", sa.Integer(), nullable=False),
+        sa.Column("total_quantity", sa.Integer(), nullable=False),
+        sa.Column("total_margin", sa.Float(), nullable=False),
+        sa.Column("total_revenue", sa.Float(), nullable=False),
+        sa.Column("total_cost", sa.Float(), nullable=False),
+    )
+    # Backfill from existing orders
+    op.execute("""
+        INSERT INTO daily_margins
+            (day, client, product_id, order_count, total_quantity, total_margin, total_revenue, total_cost)
+        SELECT date(tenders.award_date), tenders.client, orders.product_id,
+               count(orders.id), sum(orders.awarded_quantity),
+               sum((products.unit_sale_price - products.unit_cost) * orders.awarded_quantity),
+               sum(products.unit_sale_price * orders.awarded_quantity),
+               sum(products.unit_cost * orders.awarded_quantity)
+        FROM tenders
+        JOIN orders ON orders.tender_id = tenders.id
+        JOIN products ON orders.product_id = products.id
+        GROUP BY date(tenders.award_date), tenders.client, orders.product_id
+    """)
+    op.execute("INSERT INTO table_versions (table_name, version) VALUES ('daily_margins', 0)")
+
+def downgrade():
+    op.execute("DELETE FROM table_versions WHERE table_name = 'daily_margins'")
+    op.drop_table("daily_margins")
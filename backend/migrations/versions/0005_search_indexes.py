@@ -0,0 +1,79 @@
+"""Full-text and SKU prefix search indexes
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# The DDL is copied from search.py as of this revision, so later changes there
+# do not rewrite history
+POSTGRESQL_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX ix_tenders_search ON tenders USING gin "
+    "((to_tsvector('simple', coalesce(client, '') || ' ' || coalesce(description, ''))))",
+    "CREATE INDEX ix_products_search ON products USING gin "
+    "((to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, ''))))",
+    "CREATE INDEX ix_products_sku_trgm ON products USING gin (lower(sku) gin_trgm_ops)",
+]
+
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS ix_products_sku_trgm",
+    "DROP INDEX IF EXISTS ix_products_search",
+    "DROP INDEX IF EXISTS ix_tenders_search",
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE tenders_fts USING fts5("
+    "client, description, content='tenders', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER tenders_fts_insert AFTER INSERT ON tenders BEGIN "
+    "INSERT INTO tenders_fts(rowid, client, description) VALUES (new.id, new.client, new.description); END",
+    "CREATE TRIGGER tenders_fts_delete AFTER DELETE ON tenders BEGIN "
+    "INSERT INTO tenders_fts(tenders_fts, rowid, client, description) "
+    "VALUES ('delete', old.id, old.client, old.description); END",
+    "CREATE TRIGGER tenders_fts_update AFTER UPDATE ON tenders BEGIN "
+    "INSERT INTO tenders_fts(tenders_fts, rowid, client, description) "
+    "VALUES ('delete', old.id, old.client, old.description); "
+    "INSERT INTO tenders_fts(rowid, client, description) VALUES (new.id, new.client, new.description); END",
+    "INSERT INTO tenders_fts(tenders_fts) VALUES ('rebuild')",
+    "CREATE VIRTUAL TABLE products_fts USING fts5("
+    "name, sku, description, content='products', content_rowid='id', prefix='2 3', "
+    "tokenize=\"unicode61 tokenchars '-_.'\")",
+    "CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts(rowid, name, sku, description) VALUES (new.id, new.name, new.sku, new.description); END",
+    "CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, sku, description) "
+    "VALUES ('delete', old.id, old.name, old.sku, old.description); END",
+    "CREATE TRIGGER products_fts_update AFTER UPDATE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, sku, description) "
+    "VALUES ('delete', old.id, old.name, old.sku, old.description); "
+    "INSERT INTO products_fts(rowid, name, sku, description) VALUES (new.id, new.name, new.sku, new.description); END",
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS products_fts_insert",
+    "DROP TRIGGER IF EXISTS products_fts_delete",
+    "DROP TRIGGER IF EXISTS products_fts_update",
+    "DROP TABLE IF EXISTS products_fts",
+    "DROP TRIGGER IF EXISTS tenders_fts_insert",
+    "DROP TRIGGER IF EXISTS tenders_fts_delete",
+    "DROP TRIGGER IF EXISTS tenders_fts_update",
+    "DROP TABLE IF EXISTS tenders_fts",
+]
+
+def _run(statements):
+    for statement in statements.get(op.get_bind().dialect.name, []):
+        op.execute(statement)
+
+def upgrade():
+    # tsvector/pg_trgm GIN indexes on PostgreSQL, FTS5 tables and triggers on SQLite
+    _run({"postgresql": POSTGRESQL_DDL, "sqlite": SQLITE_DDL})
+
+def downgrade():
+    _run({"postgresql": POSTGRESQL_DROP, "sqlite": SQLITE_DROP})
@@ -0,0 +1,21 @@
+"""Index the filter and sort columns of the list endpoints
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # GET /tenders/?client=... and sort=client; GET /products/?sort=name
+    op.create_index("ix_tenders_client", "tenders", ["client"])
+    op.create_index("ix_products_name", "products", ["name"])
+
+def downgrade():
+    op.drop_index("ix_products_name", table_name="products")
+    op.drop_index("ix_tenders_client", table_name="tenders")
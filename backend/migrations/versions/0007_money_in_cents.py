@@ -0,0 +1,104 @@
+"""Store money as integer cents
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+MONEY_COLUMNS = {
+    "products": ["unit_sale_price", "unit_cost"],
+    "tender_margins": ["total_margin", "total_revenue", "total_cost"],
+    "daily_margins": ["total_margin", "total_revenue", "total_cost"],
+}
+
+# Rollup totals summed in floating point may have drifted, so they are recomputed
+# from the converted prices rather than converted themselves
+REBUILD_ROLLUPS = [
+    "DELETE FROM tender_margins",
+    """
+    INSERT INTO tender_margins (tender_id, order_count, total_margin, total_revenue, total_cost)
+    SELECT tenders.id, count(orders.id),
+           coalesce(sum((products.unit_sale_price - products.unit_cost) * orders.awarded_quantity), 0),
+           coalesce(sum(products.unit_sale_price * orders.awarded_quantity), 0),
+           coalesce(sum(products.unit_cost * orders.awarded_quantity), 0)
+    FROM tenders
+    LEFT JOIN orders ON orders.tender_id = tenders.id
+    LEFT JOIN products ON orders.product_id = products.id
+    GROUP BY tenders.id
+    """,
+    "DELETE FROM daily_margins",
+    """
+    INSERT INTO daily_margins
+        (day, client, product_id, order_count, total_quantity, total_margin, total_revenue, total_cost)
+    SELECT date(tenders.award_date), tenders.client, orders.product_id,
+           count(orders.id), sum(orders.awarded_quantity),
+           sum((products.unit_sale_price - products.unit_cost) * orders.awarded_quantity),
+           sum(products.unit_sale_price * orders.awarded_quantity),
+           sum(products.unit_cost * orders.awarded_quantity)
+    FROM tenders
+    JOIN orders ON orders.tender_id = tenders.id
+    JOIN products ON orders.product_id = products.id
+    GROUP BY date(tenders.award_date), tenders.client, orders.product_id
+    """,
+]
+
+# Batch mode rebuilds products on SQLite, which drops the triggers keeping its
+# FTS5 table in sync; the DDL is copied from migration 0005
+SQLITE_DROP_PRODUCT_SEARCH = [
+    "DROP TRIGGER IF EXISTS products_fts_insert",
+    "DROP TRIGGER IF EXISTS products_fts_delete",
+    "DROP TRIGGER IF EXISTS products_fts_update",
+    "DROP TABLE IF EXISTS products_fts",
+]
+
+SQLITE_CREATE_PRODUCT_SEARCH = [
+    "CREATE VIRTUAL TABLE products_fts USING fts5("
+    "name, sku, description, content='products', content_rowid='id', prefix='2 3', "
+    "tokenize=\"unicode61 tokenchars '-_.'\")",
+    "CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts(rowid, name, sku, description) VALUES (new.id, new.name, new.sku, new.description); END",
+    "CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, sku, description) "
+    "VALUES ('delete', old.id, old.name, old.sku, old.description); END",
+    "CREATE TRIGGER products_fts_update AFTER UPDATE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, sku, description) "
+    "VALUES ('delete', old.id, old.name, old.sku, old.description); "
+    "INSERT INTO products_fts(rowid, name, sku, description) VALUES (new.id, new.name, new.sku, new.description); END",
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+]
+
+def _convert(from_type, to_type, expression: str):
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        for statement in SQLITE_DROP_PRODUCT_SEARCH:
+            op.execute(statement)
+    for table, columns in MONEY_COLUMNS.items():
+        if bind.dialect.name == "postgresql":
+            for column in columns:
+                op.alter_column(
+                    table, column, type_=to_type, existing_type=from_type, existing_nullable=False,
+                    postgresql_using=expression.format(column=column) + f"::{to_type.compile(dialect=bind.dialect)}",
+                )
+            continue
+        op.execute(f"UPDATE {table} SET " + ", ".join(f"{column} = {expression.format(column=column)}" for column in columns))
+        with op.batch_alter_table(table) as batch:
+            for column in columns:
+                batch.alter_column(column, type_=to_type, existing_type=from_type, existing_nullable=False)
+    if bind.dialect.name == "sqlite":
+        for statement in SQLITE_CREATE_PRODUCT_SEARCH:
+            op.execute(statement)
+
+def upgrade():
+    _convert(sa.Float(), sa.BigInteger(), "round({column} * 100)")
+    for statement in REBUILD_ROLLUPS:
+        op.execute(statement)
+
+def downgrade():
+    _convert(sa.BigInteger(), sa.Float(), "{column} / 100.0")
@@ -0,0 +1,39 @@
+"""Index product SKUs in the PostgreSQL full-text document
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+# SQLite's products_fts already indexes the SKU, so only PostgreSQL changes:
+# the SKU joins the tsvector document and the separate pg_trgm index goes
+UPGRADE = [
+    "DROP INDEX IF EXISTS ix_products_sku_trgm",
+    "DROP INDEX IF EXISTS ix_products_search",
+    "CREATE INDEX ix_products_search ON products USING gin "
+    "((to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(sku, '') || ' ' || coalesce(description, ''))))",
+]
+
+DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_products_search",
+    "CREATE INDEX ix_products_search ON products USING gin "
+    "((to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, ''))))",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX ix_products_sku_trgm ON products USING gin (lower(sku) gin_trgm_ops)",
+]
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        for statement in UPGRADE:
+            op.execute(statement)
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        for statement in DOWNGRADE:
+            op.execute(statement)
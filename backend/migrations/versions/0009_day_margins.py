@@ -0,0 +1,37 @@
+"""Per-day margin rollup for the unsplit time series
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "day_margins",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("order_count", sa.Integer(), nullable=False),
+        sa.Column("total_quantity", sa.Integer(), nullable=False),
+        # Money in integer cents, as since 0007
+        sa.Column("total_margin", sa.BigInteger(), nullable=False),
+        sa.Column("total_revenue", sa.BigInteger(), nullable=False),
+        sa.Column("total_cost", sa.BigInteger(), nullable=False),
+    )
+    # Backfill from the (day, client, product) rollup
+    op.execute("""
+        INSERT INTO day_margins (day, order_count, total_quantity, total_margin, total_revenue, total_cost)
+        SELECT day, sum(order_count), sum(total_quantity), sum(total_margin), sum(total_revenue), sum(total_cost)
+        FROM daily_margins
+        GROUP BY day
+    """)
+    op.execute("INSERT INTO table_versions (table_name, version) VALUES ('day_margins', 0)")
+
+def downgrade():
+    op.execute("DELETE FROM table_versions WHERE table_name = 'day_margins'")
+    op.drop_table("day_margins")
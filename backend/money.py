@@ -0,0 +1,61 @@
+"""Fixed-point money.
+
+Prices and margin totals are stored as integer cents (``Money`` columns) and
+surface in Python as ``Decimal`` values with two places. Sums, differences
+and quantity products of money columns therefore stay exact in SQL (integer
+arithmetic on SQLite and PostgreSQL alike) and in Python (``Decimal``).
+Values are rounded half-up to the cent when they are written.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+from sqlalchemy import BigInteger, Integer
+from sqlalchemy.sql import operators
+from sqlalchemy.types import TypeDecorator
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+def to_decimal(value) -> Decimal:
+    """Round a float, int, str or Decimal amount to a whole cent"""
+    if not isinstance(value, Decimal):
+        # str() keeps the shortest repr, so 19.99 becomes 19.99 rather than 19.989999...
+        value = Decimal(str(value) if isinstance(value, float) else value)
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+def to_cents(value) -> int:
+    return int(to_decimal(value).scaleb(2))
+
+def from_cents(cents) -> Decimal:
+    if isinstance(cents, int):
+        return Decimal(cents).scaleb(-2)
+    # Averages and percentiles of cents come back fractional
+    return (Decimal(str(cents)) if isinstance(cents, float) else Decimal(cents)).scaleb(-2).quantize(CENT, rounding=ROUND_HALF_UP)
+
+class Money(TypeDecorator):
+    """Amount stored as BIGINT cents and exposed as a two-place Decimal"""
+    impl = BigInteger
+    cache_ok = True
+
+    class Comparator(TypeDecorator.Comparator):
+        def _adapt_expression(self, op, other_comparator):
+            # money +/- money and money * quantity are still money, in cents
+            if op in (operators.add, operators.sub, operators.mul, operators.neg):
+                return op, self.type
+            return super()._adapt_expression(op, other_comparator)
+
+    comparator_factory = Comparator
+    
+    @property
+    def python_type(self):
+        return Decimal
+
+    def coerce_compared_value(self, op, value):
+        # A literal multiplier is a quantity, not an amount
+        if op is operators.mul:
+            return Integer()
+        return self
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_cents(value)
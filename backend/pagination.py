@@ -0,0 +1,104 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from fastapi import HTTPException, Response
+
+class Cursor(NamedTuple):
+    """Where the next page starts: the last row's id and its values for the sort fields"""
+    id: int
+    values: Tuple = ()
+
+def _sort_spec(sort: Sequence[Tuple[str, bool]]) -> List[str]:
+    return [("-" if descending else "") + field for field, descending in sort]
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+def _python_value(value, python_type):
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is Decimal:
+        return Decimal(str(value))
+    if not isinstance(value, python_type) or isinstance(value, bool):
+        raise TypeError(value)
+    return value
+
+# Opaque keyset cursors: the last row a client has seen, with its sort values so
+# the next page seeks on them directly rather than re-reading a row that may
+# have changed or gone since
+def encode_cursor(last_id: int, sort: Sequence[Tuple[str, bool]] = (), values: Sequence = ()) -> str:
+    """Encode the last seen id, and its values for the sort fields, into an opaque cursor token"""
+    payload = {"id": last_id}
+    if sort:
+        payload["sort"] = _sort_spec(sort)
+        payload["values"] = [_json_value(value) for value in values]
+    payload = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str], sort: Sequence[Tuple[str, bool]] = (), columns: Optional[dict] = None) -> Optional[Cursor]:
+    """Decode a cursor token issued for the same sort; columns maps sort fields to their columns"""
+    if cursor is None:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        last_id = payload["id"]
+        values = payload.get("values", [])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_id, int) or not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if payload.get("sort", []) != _sort_spec(sort) or len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Cursor was issued for a different sort")
+    try:
+        values = tuple(
+            _python_value(value, columns[field].type.python_type) for value, (field, _) in zip(values, sort)
+        )
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return Cursor(last_id, values)
+
+def set_next_cursor(response: Response, items: Sequence, limit: int, sort: Sequence[Tuple[str, bool]] = ()):
+    """Advertise the cursor for the next page when the current page is full"""
+    if items and len(items) >= limit:
+        last = items[-1]
+        value = last.get if isinstance(last, dict) else lambda field: getattr(last, field)
+        response.headers["X-Next-Cursor"] = encode_cursor(value("id"), sort, [value(field) for field, _ in sort])
+
+def set_total_count(response: Response, total: int):
+    """Report the size of the whole listing, independent of the page"""
+    response.headers["X-Total-Count"] = str(total)
+
+def parse_sort(sort: Optional[str], allowed: Iterable[str]) -> List[Tuple[str, bool]]:
+    """Parse a sort parameter such as "-total_margin,client" into (field, descending) pairs"""
+    if not sort:
+        return []
+    allowed = set(allowed)
+    terms = []
+    for term in sort.split(","):
+        term = term.strip()
+        field = term.lstrip("-")
+        if field not in allowed:
+            raise HTTPException(status_code=400, detail=f"Cannot sort by '{field}'; use one of {', '.join(sorted(allowed))}")
+        if field in {name for name, _ in terms}:
+            raise HTTPException(status_code=400, detail=f"Sort field '{field}' is repeated")
+        terms.append((field, term.startswith("-")))
+    return terms
+
+def parse_ids(ids: str, max_ids: int) -> List[int]:
+    """Parse a comma-separated id list such as "1,2,3", dropping repeats"""
+    try:
+        parsed = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if not parsed:
+        raise HTTPException(status_code=400, detail="ids must name at least one id")
+    if len(parsed) > max_ids:
+        raise HTTPException(status_code=400, detail=f"At most {max_ids} ids may be requested at once")
+    return parsed
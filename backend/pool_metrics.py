@@ -0,0 +1,119 @@
+"""Connection pool configuration and checkout instrumentation.
+
+Pool sizing comes from the environment; every engine gets a pool subclass
+that records how long checkouts take and how many fail, exposed through
+``pool_stats()``.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds (seconds) of the checkout wait time histogram buckets
+WAIT_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+def pool_options(url: str) -> dict:
+    """Pool keyword arguments for create_engine, read from the environment"""
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        # In-memory SQLite keeps one connection per thread; there is no pool to size
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+    }
+
+class PoolMetrics:
+    """Counters and a wait time histogram for one connection pool"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+    
+    def observe(self, seconds: float, error: Optional[BaseException] = None):
+        with self._lock:
+            if error is not None:
+                self.checkout_failures += 1
+                if isinstance(error, exc.TimeoutError):
+                    self.checkout_timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += seconds
+            for index, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.wait_buckets[index] += 1
+                    break
+            else:
+                self.wait_buckets[-1] += 1
+    
+    def snapshot(self) -> dict:
+        pool = self.pool
+        with self._lock:
+            cumulative = 0
+            histogram = {}
+            for bound, count in zip(WAIT_BUCKETS + [float("inf")], self.wait_buckets):
+                cumulative += count
+                histogram["+Inf" if bound == float("inf") else str(bound)] = cumulative
+            return {
+                "name": self.name,
+                "pool_class": type(pool).__name__ if pool is not None else None,
+                "size": pool.size() if pool is not None else None,
+                "checked_out": pool.checkedout() if pool is not None else None,
+                "checked_in": pool.checkedin() if pool is not None else None,
+                "overflow": pool.overflow() if pool is not None else None,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checkout_timeouts": self.checkout_timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_histogram": histogram,
+            }
+
+_registry: Dict[str, PoolMetrics] = {}
+
+def instrumented_pool_class(name: str, base=QueuePool):
+    """Create a pool class that reports checkouts to the metrics named ``name``"""
+    metrics = _registry.setdefault(name, PoolMetrics(name))
+    
+    class InstrumentedPool(base):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            metrics.pool = self
+        
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                connection = super().connect()
+            except Exception as error:
+                metrics.observe(time.perf_counter() - start, error)
+                raise
+            metrics.observe(time.perf_counter() - start)
+            return connection
+    
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
+
+def engine_options(name: str, url: str, base=QueuePool) -> dict:
+    """create_engine keyword arguments with configured, instrumented pooling"""
+    options = pool_options(url)
+    if options:
+        options["poolclass"] = instrumented_pool_class(name, base)
+    return options
+
+def pool_stats() -> List[dict]:
+    return [metrics.snapshot() for metrics in _registry.values()]
@@ -0,0 +1,140 @@
+"""Read-through cache for the product catalog.
+
+Entries are keyed by product id, SKU and list page, and every key embeds a
+catalog generation number. Any product write bumps the generation, which
+invalidates every cached entry at once; with the Redis backend the
+generation is shared, so a write in one worker invalidates all of them.
+Callers (crud.py) also put the products table version into the key, so the
+in-process cache of one worker misses once another worker has written.
+
+Backend selection (environment):
+    PRODUCT_CACHE_URL      unset -> in-process TTL + LRU cache
+                           redis://... -> shared Redis (needs the redis package)
+    PRODUCT_CACHE_TTL      seconds an entry stays valid (default 60)
+    PRODUCT_CACHE_MAX_SIZE entries kept by the in-process cache (default 1024)
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+GENERATION_KEY = "products:generation"
+
+class LocalBackend:
+    """In-process key/value store with per-entry TTL and LRU eviction"""
+    
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.evictions = 0
+        self._entries = OrderedDict()
+        # Counters (the generation) are kept apart so they are never evicted
+        self._counters = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._counters:
+                return str(self._counters[key])
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: str, ex: Optional[float] = None):
+        with self._lock:
+            expires_at = time.monotonic() + ex if ex else None
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+class RedisBackend:
+    """Adapter over a Redis-compatible client (get / set with ex / incr)"""
+    
+    def __init__(self, client):
+        self.client = client
+        self.evictions = 0
+    
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(key)
+        return value.decode() if isinstance(value, bytes) else value
+    
+    def set(self, key: str, value: str, ex: Optional[float] = None):
+        self.client.set(key, value, ex=int(ex) if ex else None)
+    
+    def incr(self, key: str) -> int:
+        return self.client.incr(key)
+
+class ProductCache:
+    def __init__(self, backend, ttl: float = 60):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+    
+    def _key(self, *parts) -> str:
+        generation = self.backend.get(GENERATION_KEY) or "0"
+        return ":".join(["products", generation] + [str(part) for part in parts])
+    
+    def get_or_load(self, key_parts: tuple, loader: Callable):
+        """Return the cached JSON-compatible value, loading it on a miss.
+        
+        A loader returning None is not cached, so new rows show up at once.
+        """
+        key = self._key(*key_parts)
+        cached = self.backend.get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return json.loads(cached)
+        with self._lock:
+            self.misses += 1
+        value = loader()
+        if value is not None:
+            self.backend.set(key, json.dumps(value), ex=self.ttl)
+        return value
+    
+    def invalidate(self):
+        """Drop every cached catalog entry (called after product writes)"""
+        self.backend.incr(GENERATION_KEY)
+        with self._lock:
+            self.invalidations += 1
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "invalidations": self.invalidations,
+            "evictions": self.backend.evictions,
+        }
+
+def create_backend():
+    url = os.getenv("PRODUCT_CACHE_URL")
+    if not url:
+        return LocalBackend(max_size=int(os.getenv("PRODUCT_CACHE_MAX_SIZE", "1024")))
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("PRODUCT_CACHE_URL is set but the 'redis' package is not installed")
+    return RedisBackend(redis.Redis.from_url(url))
+
+product_cache = ProductCache(create_backend(), ttl=float(os.getenv("PRODUCT_CACHE_TTL", "60")))
@@ -0,0 +1,226 @@
+"""Per-request SQL and timing instrumentation.
+
+Engine events count every statement a request executes and time it; an ASGI
+middleware times the handler and adds a ``Server-Timing`` header. Totals are
+kept per route for ``GET /metrics`` (Prometheus text format) and
+``GET /health/requests`` (JSON, including each route's slowest statement).
+
+Setting ``QUERY_BUDGET`` makes any request that runs more statements than
+the budget fail with ``QueryBudgetExceeded``; tests use it to catch N+1
+query patterns.
+"""
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds of the request latency (seconds) and query count histogram buckets
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+QUERY_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100]
+STATEMENT_PREVIEW = 500
+
+# Statement budget per request; per-route budgets override the global one
+QUERY_BUDGET: Optional[int] = int(os.getenv("QUERY_BUDGET")) if os.getenv("QUERY_BUDGET") else None
+ROUTE_QUERY_BUDGETS: Dict[str, int] = {}
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+class RequestStats:
+    """Statements executed while serving one request"""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        # Unmatched paths share one label to keep the metric cardinality bounded
+        return route.path if route is not None else "unmatched"
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def set_query_budget(limit: Optional[int], route: Optional[str] = None):
+    """Set (or clear with None) the statement budget globally or for one route template"""
+    global QUERY_BUDGET
+    if route is None:
+        QUERY_BUDGET = limit
+    elif limit is None:
+        ROUTE_QUERY_BUDGETS.pop(route, None)
+    else:
+        ROUTE_QUERY_BUDGETS[route] = limit
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_seconds += elapsed
+    if elapsed >= stats.slowest_seconds:
+        stats.slowest_seconds = elapsed
+        stats.slowest_statement = statement
+
+    budget = ROUTE_QUERY_BUDGETS.get(stats.route, QUERY_BUDGET)
+    if budget is not None and stats.queries > budget:
+        raise QueryBudgetExceeded(f"{stats.route} ran more than {budget} queries")
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
+
+class Histogram:
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[index] += 1
+                return
+        self.counts[-1] += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        buckets = []
+        for bound, count in zip(self.bounds + [float("inf")], self.counts):
+            total += count
+            buckets.append(("+Inf" if bound == float("inf") else str(bound), total))
+        return buckets
+
+class RouteMetrics:
+    def __init__(self):
+        self.statuses: Dict[int, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.max_queries = 0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+
+class MetricsRegistry:
+    """Request totals keyed by (method, route template)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+
+    def observe(self, method: str, stats: RequestStats, status: int, seconds: float):
+        with self._lock:
+            metrics = self.routes.setdefault((method, stats.route), RouteMetrics())
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(stats.queries)
+            metrics.db_seconds += stats.db_seconds
+            metrics.max_queries = max(metrics.max_queries, stats.queries)
+            if stats.slowest_statement is not None and stats.slowest_seconds >= metrics.slowest_seconds:
+                metrics.slowest_seconds = stats.slowest_seconds
+                metrics.slowest_statement = stats.slowest_statement[:STATEMENT_PREVIEW]
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return [
+                {
+                    "method": method,
+                    "route": route,
+                    "requests": metrics.latency.count,
+                    "statuses": dict(metrics.statuses),
+                    "average_seconds": metrics.latency.sum / metrics.latency.count,
+                    "average_queries": metrics.queries.sum / metrics.queries.count,
+                    "max_queries": metrics.max_queries,
+                    "db_seconds_total": metrics.db_seconds,
+                    "slowest_statement_seconds": metrics.slowest_seconds,
+                    "slowest_statement": metrics.slowest_statement,
+                }
+                for (method, route), metrics in sorted(self.routes.items())
+            ]
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP http_requests_total Requests served, by route and status",
+            "# TYPE http_requests_total counter",
+        ]
+        with self._lock:
+            routes = sorted(self.routes.items())
+            for (method, route), metrics in routes:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+            for name, help_text, attribute in [
+                ("http_request_duration_seconds", "Time to serve a request", "latency"),
+                ("http_request_db_queries", "SQL statements executed per request", "queries"),
+            ]:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (method, route), metrics in routes:
+                    histogram = getattr(metrics, attribute)
+                    labels = f'method="{method}",route="{route}"'
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+            lines.append("# HELP http_request_db_seconds_total Time spent executing SQL statements")
+            lines.append("# TYPE http_request_db_seconds_total counter")
+            for (method, route), metrics in routes:
+                lines.append(f'http_request_db_seconds_total{{method="{method}",route="{route}"}} {metrics.db_seconds}')
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+def server_timing(stats: RequestStats, handler_seconds: float) -> str:
+    return ", ".join([
+        f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries"',
+        f"db-slowest;dur={stats.slowest_seconds * 1000:.2f}",
+        f"app;dur={handler_seconds * 1000:.2f}",
+    ])
+
+class RequestMetricsMiddleware:
+    """Time each HTTP request, count its statements and report them"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Streaming bodies keep running after this; their statements only reach /metrics
+                header = server_timing(stats, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            registry.observe(scope["method"], stats, status, time.perf_counter() - start)
+            _current.reset(token)
@@ -0,0 +1,350 @@
+"""Maintenance of the materialized margin rollups.
+
+tender_margins holds per-tender totals, daily_margins totals per award day,
+client and product, and day_margins totals per award day. Writes describe
+what they change as signed per-order deltas (order_deltas, line_deltas,
+price_deltas) and apply_deltas adds those to the rows of each rollup with one
+INSERT ... ON CONFLICT DO UPDATE per table, so concurrent writes to the same
+rows add up instead of racing each other's delete and re-insert. Daily rows
+left without orders are deleted. Deltas are priced from the products rows and
+bucketed by the tenders rows as the statement reads them, so writers lock what
+they depend on first and always in the same order, orders before tenders
+before products: order writes lock their order row and share-lock the
+tenders and products of its lines, tender moves and deletes lock the tender
+and share-lock the products of its orders, and price changes lock their
+products (FOR NO KEY UPDATE, which still lets the rollup foreign keys
+share-lock them). Run as a script to check the rollups for drift or
+rebuild them from scratch:
+
+    python rollups.py check
+    python rollups.py rebuild
+"""
+import argparse
+import sys
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import Date, case, func, literal, select, tuple_, union_all
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from database import Tender, Product, Order, TenderMargin, DailyMargin, DayMargin
+from money import Money, ZERO
+
+ROLLUP_FIELDS = ["order_count", "total_margin", "total_revenue", "total_cost"]
+DAILY_FIELDS = ["order_count", "total_quantity", "total_margin", "total_revenue", "total_cost"]
+
+def order_totals_query(db: Session):
+    """Per-tender totals computed from scratch by joining orders to products"""
+    return (
+        db.query(
+            Order.tender_id.label("tender_id"),
+            func.count(Order.id).label("order_count"),
+            func.sum((Product.unit_sale_price - Product.unit_cost) * Order.awarded_quantity).label("total_margin"),
+            func.sum(Product.unit_sale_price * Order.awarded_quantity).label("total_revenue"),
+            func.sum(Product.unit_cost * Order.awarded_quantity).label("total_cost"),
+        )
+        .join(Product, Order.product_id == Product.id)
+        .group_by(Order.tender_id)
+    )
+
+def award_day():
+    """Calendar day of a tender's award date"""
+    return func.date(Tender.award_date, type_=Date)
+
+def daily_totals_query(db: Session):
+    """Per award day, client and product totals computed from scratch"""
+    day = award_day()
+    return (
+        db.query(
+            day.label("day"),
+            Tender.client.label("client"),
+            Order.product_id.label("product_id"),
+            func.count(Order.id).label("order_count"),
+            func.sum(Order.awarded_quantity).label("total_quantity"),
+            func.sum((Product.unit_sale_price - Product.unit_cost) * Order.awarded_quantity).label("total_margin"),
+            func.sum(Product.unit_sale_price * Order.awarded_quantity).label("total_revenue"),
+            func.sum(Product.unit_cost * Order.awarded_quantity).label("total_cost"),
+        )
+        .join(Order, Order.tender_id == Tender.id)
+        .join(Product, Order.product_id == Product.id)
+        .group_by(day, Tender.client, Order.product_id)
+    )
+
+def day_totals_query(db: Session):
+    """Per award day totals computed from scratch"""
+    day = award_day()
+    return (
+        db.query(
+            day.label("day"),
+            func.count(Order.id).label("order_count"),
+            func.sum(Order.awarded_quantity).label("total_quantity"),
+            func.sum((Product.unit_sale_price - Product.unit_cost) * Order.awarded_quantity).label("total_margin"),
+            func.sum(Product.unit_sale_price * Order.awarded_quantity).label("total_revenue"),
+            func.sum(Product.unit_cost * Order.awarded_quantity).label("total_cost"),
+        )
+        .join(Order, Order.tender_id == Tender.id)
+        .join(Product, Order.product_id == Product.id)
+        .group_by(day)
+    )
+
+def _summed_daily_margins(db: Session):
+    """day_margins rows summed from the (day, client, product) rollup"""
+    return db.query(
+        DailyMargin.day, *[func.sum(getattr(DailyMargin, field)) for field in DAILY_FIELDS]
+    ).group_by(DailyMargin.day)
+
+def _line_totals(tender_id, product_id, count, quantity, bucket=None) -> list:
+    """Delta columns of signed order lines, priced at their products' prices
+
+    Lines are bucketed by their tender's award day and client unless an
+    explicit (day, client) bucket is given.
+    """
+    day, client = bucket if bucket else (award_day(), Tender.client)
+    return [
+        tender_id.label("tender_id"),
+        day.label("day"),
+        client.label("client"),
+        product_id.label("product_id"),
+        count.label("order_count"),
+        quantity.label("total_quantity"),
+        ((Product.unit_sale_price - Product.unit_cost) * quantity).label("total_margin"),
+        (Product.unit_sale_price * quantity).label("total_revenue"),
+        (Product.unit_cost * quantity).label("total_cost"),
+    ]
+
+def order_deltas(*criteria, sign: int = 1, bucket: Optional[Tuple[date, str]] = None):
+    """Add (sign=1) or remove (sign=-1) the stored orders matching the criteria
+
+    bucket overrides the (award day, client) the orders are counted under,
+    for removing a tender's orders from where it was before a move.
+    """
+    if bucket:
+        bucket = (literal(bucket[0], Date), literal(bucket[1]))
+    return (
+        select(*_line_totals(Order.tender_id, Order.product_id, literal(sign), Order.awarded_quantity * sign, bucket))
+        .select_from(Order)
+        .join(Tender, Order.tender_id == Tender.id)
+        .join(Product, Order.product_id == Product.id)
+        .where(*criteria)
+    )
+
+def line_deltas(lines: Iterable[Tuple[int, int, int, int]]):
+    """Add or remove order lines given as (tender_id, product_id, quantity, sign)"""
+    values = union_all(*[
+        select(
+            literal(tender_id).label("tender_id"),
+            literal(product_id).label("product_id"),
+            literal(sign).label("sign"),
+            literal(sign * quantity).label("quantity"),
+        )
+        for tender_id, product_id, quantity, sign in lines
+    ]).subquery()
+    return (
+        select(*_line_totals(values.c.tender_id, values.c.product_id, values.c.sign, values.c.quantity))
+        .join_from(values, Tender, values.c.tender_id == Tender.id)
+        .join(Product, values.c.product_id == Product.id)
+    )
+
+def price_deltas(changes: Dict[int, Tuple[Decimal, Decimal]]):
+    """Reprice the stored orders of products whose (sale price, cost) changed by the given amounts"""
+    def per_unit(position: int):
+        return case(
+            {product_id: literal(amounts[position], Money()) for product_id, amounts in changes.items()},
+            value=Order.product_id,
+        )
+    sale, cost = per_unit(0), per_unit(1)
+    return (
+        select(
+            Order.tender_id.label("tender_id"),
+            award_day().label("day"),
+            Tender.client.label("client"),
+            Order.product_id.label("product_id"),
+            literal(0).label("order_count"),
+            literal(0).label("total_quantity"),
+            ((sale - cost) * Order.awarded_quantity).label("total_margin"),
+            (sale * Order.awarded_quantity).label("total_revenue"),
+            (cost * Order.awarded_quantity).label("total_cost"),
+        )
+        .join(Tender, Order.tender_id == Tender.id)
+        .where(Order.product_id.in_(changes))
+    )
+
+def _add_totals(db: Session, model, keys: List[str], fields: List[str], totals, prune: bool = False):
+    """Add aggregated deltas to a rollup table, creating the rows it lacks
+
+    With prune, rows left without orders are deleted, as a fresh
+    aggregation would not have them.
+    """
+    dialect_insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = dialect_insert(model).from_select(keys + fields, totals)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={field: getattr(model, field) + stmt.excluded[field] for field in fields},
+    )
+    if not prune:
+        db.execute(stmt)
+        return
+    columns = [getattr(model, key) for key in keys]
+    rows = db.execute(stmt.returning(model.order_count, *columns))
+    emptied = [tuple(row[1:]) for row in rows if row.order_count == 0]
+    if emptied:
+        db.query(model).filter(tuple_(*columns).in_(emptied), model.order_count == 0).delete(synchronize_session=False)
+
+def apply_deltas(db: Session, deltas, tenders: bool = True):
+    """Add signed deltas to the rollups of the tenders and buckets they touch
+
+    tenders=False leaves tender_margins alone, for deltas that only move
+    orders between daily buckets or whose tender rows are being deleted.
+    """
+    deltas = deltas.subquery()
+    def summed(fields):
+        return [func.sum(deltas.c[field]) for field in fields]
+    # Rows are written, and so locked, in key order and one table after the
+    # other, which keeps concurrent writers touching several rows from deadlocking
+    if tenders:
+        _add_totals(
+            db, TenderMargin, ["tender_id"], ROLLUP_FIELDS,
+            select(deltas.c.tender_id, *summed(ROLLUP_FIELDS))
+            .group_by(deltas.c.tender_id)
+            .order_by(deltas.c.tender_id),
+        )
+    bucket = [deltas.c.day, deltas.c.client, deltas.c.product_id]
+    _add_totals(
+        db, DailyMargin, ["day", "client", "product_id"], DAILY_FIELDS,
+        select(*bucket, *summed(DAILY_FIELDS)).group_by(*bucket).order_by(*bucket),
+        prune=True,
+    )
+    _add_totals(
+        db, DayMargin, ["day"], DAILY_FIELDS,
+        select(deltas.c.day, *summed(DAILY_FIELDS)).group_by(deltas.c.day).order_by(deltas.c.day),
+        prune=True,
+    )
+
+def rebuild_tender_margins(db: Session) -> int:
+    """Recompute the whole rollup from scratch; returns the number of tenders"""
+    totals = order_totals_query(db).subquery()
+    select = (
+        db.query(
+            Tender.id,
+            func.coalesce(totals.c.order_count, 0),
+            func.coalesce(totals.c.total_margin, literal(0)),
+            func.coalesce(totals.c.total_revenue, literal(0)),
+            func.coalesce(totals.c.total_cost, literal(0)),
+        )
+        .outerjoin(totals, totals.c.tender_id == Tender.id)
+    )
+    db.query(TenderMargin).delete(synchronize_session=False)
+    db.execute(
+        TenderMargin.__table__.insert().from_select(["tender_id"] + ROLLUP_FIELDS, select.statement)
+    )
+    db.commit()
+    return db.query(func.count(TenderMargin.tender_id)).scalar()
+
+def rebuild_daily_margins(db: Session) -> int:
+    """Recompute the whole daily rollup and its per-day totals from scratch; returns the number of rows"""
+    db.query(DailyMargin).delete(synchronize_session=False)
+    db.execute(
+        DailyMargin.__table__.insert().from_select(
+            ["day", "client", "product_id"] + DAILY_FIELDS, daily_totals_query(db).statement
+        )
+    )
+    db.query(DayMargin).delete(synchronize_session=False)
+    db.execute(DayMargin.__table__.insert().from_select(["day"] + DAILY_FIELDS, _summed_daily_margins(db).statement))
+    db.commit()
+    return db.query(func.count()).select_from(DailyMargin).scalar()
+
+def rebuild_all(db: Session):
+    rebuild_tender_margins(db)
+    rebuild_daily_margins(db)
+
+def check_tender_margins(db: Session) -> List[dict]:
+    """Compare the stored rollup against a full recomputation and report drift"""
+    stored = {row.tender_id: row for row in db.query(TenderMargin)}
+    totals = {row.tender_id: row for row in order_totals_query(db)}
+    drift = []
+    for (tender_id,) in db.query(Tender.id).order_by(Tender.id):
+        expected = _rollup_row(tender_id, totals.get(tender_id))
+        row = stored.get(tender_id)
+        if row is None:
+            drift.append({"tender_id": tender_id, "field": None, "stored": None, "expected": expected})
+            continue
+        for field in ROLLUP_FIELDS:
+            actual, wanted = getattr(row, field), expected[field]
+            # Money totals are exact, so any difference is drift
+            if actual != wanted:
+                drift.append({"tender_id": tender_id, "field": field, "stored": actual, "expected": wanted})
+    return drift
+
+def check_daily_margins(db: Session) -> List[dict]:
+    """Compare the stored daily rollup against a full recomputation and report drift"""
+    key = lambda row: (row.day, row.client, row.product_id)
+    stored = {key(row): row for row in db.query(DailyMargin)}
+    expected = {key(row): row for row in daily_totals_query(db)}
+    drift = []
+    for bucket in sorted(set(stored) | set(expected), key=str):
+        row, wanted = stored.get(bucket), expected.get(bucket)
+        if row is None or wanted is None:
+            drift.append({"bucket": bucket, "field": None, "stored": row is not None, "expected": wanted is not None})
+            continue
+        for field in DAILY_FIELDS:
+            actual, value = getattr(row, field), getattr(wanted, field)
+            if actual != value:
+                drift.append({"bucket": bucket, "field": field, "stored": actual, "expected": value})
+    return drift
+
+def check_day_margins(db: Session) -> List[dict]:
+    """Compare the stored per-day totals against a full recomputation and report drift"""
+    stored = {row.day: row for row in db.query(DayMargin)}
+    expected = {row.day: row for row in day_totals_query(db)}
+    drift = []
+    for day in sorted(set(stored) | set(expected)):
+        row, wanted = stored.get(day), expected.get(day)
+        if row is None or wanted is None:
+            drift.append({"bucket": day, "field": None, "stored": row is not None, "expected": wanted is not None})
+            continue
+        for field in DAILY_FIELDS:
+            actual, value = getattr(row, field), getattr(wanted, field)
+            if actual != value:
+                drift.append({"bucket": day, "field": field, "stored": actual, "expected": value})
+    return drift
+
+def _rollup_row(tender_id: int, totals) -> dict:
+    if totals is None:
+        return {"tender_id": tender_id, "order_count": 0, "total_margin": ZERO, "total_revenue": ZERO, "total_cost": ZERO}
+    return {"tender_id": tender_id, **{field: getattr(totals, field) for field in ROLLUP_FIELDS}}
+
+def main(argv=None):
+    from database import SessionLocal
+    
+    parser = argparse.ArgumentParser(description="Check or rebuild the margin rollups")
+    parser.add_argument("command", choices=["check", "rebuild"])
+    args = parser.parse_args(argv)
+    
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            tenders = rebuild_tender_margins(db)
+            days = rebuild_daily_margins(db)
+            print(f"Rebuilt margin rollup for {tenders} tenders and {days} daily rows")
+            return 0
+        drift = check_tender_margins(db)
+        for entry in drift:
+            if entry["field"] is None:
+                print(f"Tender {entry['tender_id']}: missing rollup row")
+            else:
+                print(f"Tender {entry['tender_id']}: {entry['field']} stored={entry['stored']} expected={entry['expected']}")
+        daily_drift = check_daily_margins(db) + check_day_margins(db)
+        for entry in daily_drift:
+            if entry["field"] is None:
+                state = "stale" if entry["stored"] else "missing"
+                print(f"Daily {entry['bucket']}: {state} rollup row")
+            else:
+                print(f"Daily {entry['bucket']}: {entry['field']} stored={entry['stored']} expected={entry['expected']}")
+        print(f"{len(drift) + len(daily_drift)} drifted values found")
+        return 1 if drift or daily_drift else 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, validator
-from typing import List, Optional
-from datetime import datetime
+from pydantic import BaseModel, conlist, root_validator, validator
+from typing import Dict, List, Optional
+from datetime import date, datetime
+from money import to_decimal
 
 # Product schemas
 class ProductBase(BaseModel):
@@ -10,14 +11,20 @@ class ProductBase(BaseModel):
     unit_cost: float
     description: Optional[str] = None
     
-    @validator('unit_sale_price')
-    def sale_price_must_be_greater_than_cost(cls, v, values):
-        if 'unit_cost' in values and v <= values['unit_cost']:
-            raise ValueError('Sale price must be greater than cost')
-        return v
+    # Prices are stored in whole cents; round first so the check below sees stored values
+    @validator('unit_sale_price', 'unit_cost')
+    def round_to_cents(cls, v):
+        return float(to_decimal(v))
 
 class ProductCreate(ProductBase):
-    pass
+    # Checked on input only: rows written before the rule existed must still
+    # serialize through the Product response model. unit_cost is declared
+    # after unit_sale_price, so compare them once both are parsed.
+    @root_validator(skip_on_failure=True)
+    def sale_price_must_be_greater_than_cost(cls, values):
+        if values['unit_sale_price'] <= values['unit_cost']:
+            raise ValueError('Sale price must be greater than cost')
+        return values
 
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
@@ -86,6 +93,12 @@ class TenderWithDetails(Tender):
     orders: List[OrderWithDetails]
     total_margin: float
 
+# Upper bound on the tenders one batch detail request may load
+MAX_TENDER_DETAIL_IDS = 100
+
+class TenderDetailsRequest(BaseModel):
+    ids: conlist(int, min_items=1, max_items=MAX_TENDER_DETAIL_IDS)
+
 class TenderSummary(BaseModel):
     id: int
     client: str
@@ -96,3 +109,113 @@ class TenderSummary(BaseModel):
     
     class Config:
         orm_mode = True
+
+# Search schemas
+class TenderSearchResult(Tender):
+    rank: float
+
+class ProductSearchResult(Product):
+    rank: float
+
+# Bulk operation schemas
+class BulkRowError(BaseModel):
+    index: int
+    detail: str
+
+class BulkOrderResult(BaseModel):
+    created: List[Order]
+    errors: List[BulkRowError]
+
+class BulkProductResult(BaseModel):
+    inserted: int
+    updated: int
+    errors: List[BulkRowError]
+
+# Analytics schemas
+class MarginDistribution(BaseModel):
+    positive: int
+    negative: int
+    zero: int
+    positive_value: float
+    negative_value: float
+
+class ClientMargin(BaseModel):
+    client: str
+    tender_count: int
+    total_margin: float
+
+class ProductMargin(BaseModel):
+    product_id: int
+    sku: str
+    name: str
+    order_count: int
+    total_quantity: int
+    total_margin: float
+
+class MarginAnalytics(BaseModel):
+    start_date: Optional[date]
+    end_date: Optional[date]
+    tender_count: int
+    product_count: int
+    total_margin: float
+    total_revenue: float
+    total_cost: float
+    average_margin: float
+    min_margin: Optional[float]
+    max_margin: Optional[float]
+    distribution: MarginDistribution
+    percentiles: Dict[str, Optional[float]]
+    top_tenders: List[TenderSummary]
+    worst_tenders: List[TenderSummary]
+    by_client: List[ClientMargin]
+    by_product: List[ProductMargin]
+
+class TimeSeriesPoint(BaseModel):
+    period: date
+    key: Optional[str]
+    order_count: int
+    total_quantity: int
+    total_margin: float
+    total_revenue: float
+    total_cost: float
+
+class MarginTimeSeries(BaseModel):
+    bucket: str
+    split: Optional[str]
+    start_date: Optional[date]
+    end_date: Optional[date]
+    points: List[TimeSeriesPoint]
+
+# Simulation schemas
+class PriceChange(BaseModel):
+    sku: str
+    sale_price_change_pct: float = 0
+    sale_price_change: float = 0
+    cost_change_pct: float = 0
+    cost_change: float = 0
+
+class MarginSimulationRequest(BaseModel):
+    changes: List[PriceChange]
+    limit: Optional[int] = None
+    
+    @validator('limit')
+    def limit_must_be_positive(cls, v):
+        if v is not None and v < 1:
+            raise ValueError('Limit must be positive')
+        return v
+
+class TenderMarginDelta(BaseModel):
+    tender_id: int
+    margin_before: float
+    margin_after: float
+    delta: float
+
+class MarginSimulation(BaseModel):
+    total_margin_before: float
+    total_margin_after: float
+    total_delta: float
+    affected_tenders: int
+    unknown_skus: List[str]
+    # Order lines whose product no longer exists; they add no margin, as in the rollups
+    unmatched_order_lines: int = 0
+    tenders: List[TenderMarginDelta]
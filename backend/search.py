@@ -0,0 +1,185 @@
+"""Ranked prefix search over tenders and products.
+
+On PostgreSQL, tender client/description and product name/SKU/description
+are matched against expression ``tsvector`` GIN indexes. On SQLite the same
+searches run against FTS5 tables (``tenders_fts``, ``products_fts``) that
+triggers keep in sync. The indexes are created by migrations 0005 and 0008,
+or by ``install_search_indexes`` for schemas built with ``create_all``.
+
+Every search term matches as a word prefix and all terms must match, so
+results narrow as the user types. Products whose SKU equals or starts with
+one of the terms rank first.
+"""
+import re
+from typing import List
+from sqlalchemy import case, func, literal_column, or_, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import column, table
+from database import Tender, Product
+import schemas
+from serialization import schema_fields
+
+TENDER_SEARCH_FIELDS = schema_fields(schemas.Tender)
+PRODUCT_SEARCH_FIELDS = schema_fields(schemas.Product)
+
+# Index expressions; queries must repeat them verbatim for PostgreSQL to use the indexes
+TENDER_DOCUMENT = "to_tsvector('simple', coalesce(tenders.client, '') || ' ' || coalesce(tenders.description, ''))"
+PRODUCT_DOCUMENT = (
+    "to_tsvector('simple', coalesce(products.name, '') || ' ' || coalesce(products.sku, '') "
+    "|| ' ' || coalesce(products.description, ''))"
+)
+
+# Added to the text rank so exact and prefix SKU matches come first
+SKU_EXACT_BOOST = 2.0
+SKU_PREFIX_BOOST = 1.0
+
+POSTGRESQL_DDL = [
+    f"CREATE INDEX ix_tenders_search ON tenders USING gin (({TENDER_DOCUMENT.replace('tenders.', '')}))",
+    f"CREATE INDEX ix_products_search ON products USING gin (({PRODUCT_DOCUMENT.replace('products.', '')}))",
+]
+
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS ix_products_search",
+    "DROP INDEX IF EXISTS ix_tenders_search",
+]
+
+def _fts5_ddl(name: str, columns: List[str], options: str) -> List[str]:
+    """External-content FTS5 table over ``name`` plus the triggers that keep it in sync"""
+    fts = f"{name}_fts"
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{col}" for col in columns)
+    old = ", ".join(f"old.{col}" for col in columns)
+    delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old});"
+    insert = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{name}', content_rowid='id', {options})",
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {name} BEGIN {insert} END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {name} BEGIN {delete} END",
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE ON {name} BEGIN {delete} {insert} END",
+        # Index rows that already exist
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+SQLITE_DDL = (
+    _fts5_ddl("tenders", ["client", "description"], "prefix='2 3'")
+    # Hyphens stay inside tokens so a SKU such as SKU-0000042 is a single term
+    + _fts5_ddl("products", ["name", "sku", "description"], "prefix='2 3', tokenize=\"unicode61 tokenchars '-_.'\"")
+)
+
+SQLITE_DROP = [
+    f"DROP {kind} IF EXISTS {fts}{suffix}"
+    for fts in ("products_fts", "tenders_fts")
+    for kind, suffix in [("TRIGGER", "_insert"), ("TRIGGER", "_delete"), ("TRIGGER", "_update"), ("TABLE", "")]
+]
+
+def install_search_indexes(connection):
+    """Create the search indexes for the connection's dialect"""
+    statements = {"postgresql": POSTGRESQL_DDL, "sqlite": SQLITE_DDL}.get(connection.dialect.name, [])
+    for statement in statements:
+        connection.execute(text(statement))
+
+def drop_search_indexes(connection):
+    statements = {"postgresql": POSTGRESQL_DROP, "sqlite": SQLITE_DROP}.get(connection.dialect.name, [])
+    for statement in statements:
+        connection.execute(text(statement))
+
+def _words(q: str) -> List[str]:
+    return re.findall(r"\w+", q.lower())
+
+def _tsquery(q: str) -> str:
+    # Only word characters reach to_tsquery, so user input cannot inject operators
+    return " & ".join(f"{word}:*" for word in _words(q))
+
+def _fts5_query(q: str) -> str:
+    # Each term is a quoted FTS5 string, so its punctuation is not query syntax
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in q.split())
+
+def _like_prefix(q: str) -> str:
+    return q.strip().lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def _fts5_table(name: str):
+    return table(name, column("rowid"))
+
+def _rows(db: Session, query, skip: int, limit: int) -> List[dict]:
+    return [row._asdict() for row in db.execute(query.offset(skip).limit(limit))]
+
+def search_tenders(db: Session, q: str, skip: int = 0, limit: int = 20) -> List[dict]:
+    """Tenders whose client or description match ``q``, best match first"""
+    columns = [getattr(Tender, field) for field in TENDER_SEARCH_FIELDS]
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        tsquery = _tsquery(q)
+        if not tsquery:
+            return []
+        document = literal_column(TENDER_DOCUMENT)
+        query_value = func.to_tsquery("simple", tsquery)
+        rank = func.ts_rank(document, query_value).label("rank")
+        query = select(*columns, rank).where(document.op("@@")(query_value))
+    elif dialect == "sqlite":
+        match = _fts5_query(q)
+        if not match:
+            return []
+        fts = _fts5_table("tenders_fts")
+        # bm25() is lower for better matches
+        rank = (-func.bm25(literal_column("tenders_fts"))).label("rank")
+        query = (
+            select(*columns, rank)
+            .select_from(fts)
+            .join(Tender, Tender.id == fts.c.rowid)
+            .where(literal_column("tenders_fts").op("MATCH")(match))
+        )
+    else:
+        words = _words(q)
+        if not words:
+            return []
+        rank = literal_column("0.0").label("rank")
+        query = select(*columns, rank).where(*[
+            or_(Tender.client.ilike(f"%{word}%"), Tender.description.ilike(f"%{word}%")) for word in words
+        ])
+    return _rows(db, query.order_by(rank.desc(), Tender.id), skip, limit)
+
+def search_products(db: Session, q: str, skip: int = 0, limit: int = 20) -> List[dict]:
+    """Products whose name, SKU or description match ``q``, SKU matches first"""
+    columns = [getattr(Product, field) for field in PRODUCT_SEARCH_FIELDS]
+    dialect = db.get_bind().dialect.name
+    # Each term is checked against the SKU on its own, so "widget AB12" boosts SKU AB12-...
+    terms = q.lower().split()
+    sku = func.lower(Product.sku)
+    sku_boost = case(
+        (or_(*[sku == term for term in terms]), SKU_EXACT_BOOST),
+        (or_(*[sku.like(_like_prefix(term), escape="\\") for term in terms]), SKU_PREFIX_BOOST),
+        else_=0.0,
+    ) if terms else literal_column("0.0")
+
+    if dialect == "postgresql":
+        tsquery = _tsquery(q)
+        if not tsquery:
+            return []
+        document = literal_column(PRODUCT_DOCUMENT)
+        query_value = func.to_tsquery("simple", tsquery)
+        rank = (func.ts_rank(document, query_value) + sku_boost).label("rank")
+        query = select(*columns, rank).where(document.op("@@")(query_value))
+    elif dialect == "sqlite":
+        match = _fts5_query(q)
+        if not match:
+            return []
+        fts = _fts5_table("products_fts")
+        # Column weights for name, sku and description
+        rank = (-func.bm25(literal_column("products_fts"), 2.0, 5.0, 1.0) + sku_boost).label("rank")
+        query = (
+            select(*columns, rank)
+            .select_from(fts)
+            .join(Product, Product.id == fts.c.rowid)
+            .where(literal_column("products_fts").op("MATCH")(match))
+        )
+    else:
+        words = _words(q)
+        if not words:
+            return []
+        rank = sku_boost.label("rank")
+        query = select(*columns, rank).where(*[
+            or_(Product.name.ilike(f"%{word}%"), Product.description.ilike(f"%{word}%"), Product.sku.ilike(f"%{word}%"))
+            for word in words
+        ])
+    return _rows(db, query.order_by(rank.desc(), Product.id), skip, limit)
@@ -1,35 +1,102 @@
 import httpx
 import asyncio
+import os
+import random
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from database import get_db, engine, Base
+from database import engine, SessionLocal, Order, Product, Tender, TenderMargin, DailyMargin
 import crud
+import rollups
 import schemas
 from typing import List
 
-# Sample data endpoints
-TENDER_SAMPLE_URL = "https://kaiken.up.railway.app/webhook/tender-sample"
-PRODUCT_SAMPLE_URL = "https://kaiken.up.railway.app/webhook/product-sample"
-ORDER_SAMPLE_URL = "https://kaiken.up.railway.app/webhook/order-sample"
+# Sample data endpoints (override to seed from a local stand-in server)
+TENDER_SAMPLE_URL = os.getenv("SEED_TENDER_URL", "https://kaiken.up.railway.app/webhook/tender-sample")
+PRODUCT_SAMPLE_URL = os.getenv("SEED_PRODUCT_URL", "https://kaiken.up.railway.app/webhook/product-sample")
+ORDER_SAMPLE_URL = os.getenv("SEED_ORDER_URL", "https://kaiken.up.railway.app/webhook/order-sample")
 
-async def fetch_sample_data(url: str):
-    """Fetch sample data from the provided endpoints"""
-    async with httpx.AsyncClient() as client:
+# HTTP behaviour for the sample feeds
+FETCH_TIMEOUT = httpx.Timeout(float(os.getenv("SEED_FETCH_TIMEOUT", "10")), connect=5.0)
+FETCH_RETRIES = int(os.getenv("SEED_FETCH_RETRIES", "3"))
+FETCH_BACKOFF = 0.5
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+# Seeding holds a Postgres advisory lock so only one worker seeds at a time;
+# other databases fall back to a lock within this process
+SEED_LOCK_KEY = 7240915
+SEED_LOCK_POLL = 1.0
+_local_seed_lock = asyncio.Lock()
+
+# Progress of seeding in this process, reported by GET /ready
+seed_status = {
+    "state": "pending",
+    "step": None,
+    "started_at": None,
+    "finished_at": None,
+    "error": None,
+    "created": None,
+}
+
+def _set_status(**fields):
+    seed_status.update(fields)
+
+@asynccontextmanager
+async def seed_lock():
+    """Hold the seeding lock, waiting while another worker seeds"""
+    if engine.dialect.name != "postgresql":
+        async with _local_seed_lock:
+            yield
+        return
+    
+    connection = await run_in_threadpool(engine.connect)
+    try_lock = text("SELECT pg_try_advisory_lock(:key)").bindparams(key=SEED_LOCK_KEY)
+    try:
+        while not await run_in_threadpool(lambda: connection.execute(try_lock).scalar()):
+            _set_status(state="waiting", step="another worker is seeding")
+            await asyncio.sleep(SEED_LOCK_POLL)
+        try:
+            yield
+        finally:
+            unlock = text("SELECT pg_advisory_unlock(:key)").bindparams(key=SEED_LOCK_KEY)
+            await run_in_threadpool(lambda: connection.execute(unlock))
+    finally:
+        await run_in_threadpool(connection.close)
+
+async def fetch_sample_data(client: httpx.AsyncClient, url: str):
+    """Fetch sample data from the provided endpoint, retrying transient failures"""
+    for attempt in range(1, FETCH_RETRIES + 1):
         try:
             response = await client.get(url)
             response.raise_for_status()
             return response.json()
-        except Exception as e:
-            print(f"Error fetching data from {url}: {e}")
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            transient = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code in RETRY_STATUS_CODES
+            if not transient or attempt == FETCH_RETRIES:
+                print(f"Error fetching data from {url}: {e}")
+                return None
+            print(f"Retrying {url} after error: {e}")
+            await asyncio.sleep(FETCH_BACKOFF * 2 ** (attempt - 1))
+        except ValueError as e:
+            print(f"Invalid JSON from {url}: {e}")
             return None
 
-async def seed_products(db: Session):
-    """Seed products from sample endpoint with proper field mapping"""
-    print("Fetching product samples...")
-    product_data = await fetch_sample_data(PRODUCT_SAMPLE_URL)
-    
+async def fetch_samples(urls: List[str]) -> dict:
+    """Fetch several sample feeds concurrently over one pooled client"""
+    if not urls:
+        return {}
+    limits = httpx.Limits(max_connections=len(urls))
+    async with httpx.AsyncClient(timeout=FETCH_TIMEOUT, limits=limits) as client:
+        results = await asyncio.gather(*[fetch_sample_data(client, url) for url in urls])
+    return dict(zip(urls, results))
+
+def prepare_products(product_data) -> List[schemas.ProductCreate]:
+    """Map the product feed to our schema, falling back to sample products"""
     if not product_data:
         # Fallback sample products
-        sample_products = [
+        product_data = [
             {
                 "name": "Office Chair",
                 "sku": "CHAIR-001",
@@ -45,14 +112,13 @@ async def seed_products(db: Session):
                 "description": "Business laptop"
             },
             {
-                "name": "Desk", 
+                "name": "Desk",
                 "sku": "DESK-001",
                 "unit_sale_price": 300.0,
                 "unit_cost": 200.0,
                 "description": "Office desk"
             }
         ]
-        product_data = sample_products
     else:
         # Process API data to match our schema
         processed_products = []
@@ -61,47 +127,33 @@ async def seed_products(db: Session):
             if not all([product.get("sku"), product.get("title"), product.get("cost")]):
                 print(f"Skipping product with missing fields: {product}")
                 continue
-                
+            
             cost = float(product.get("cost", 0))
             # Calculate sale price with 40% margin (as per API margin field)
             sale_price = cost * 1.4
             
-            processed_product = {
+            processed_products.append({
                 "name": product.get("title", ""),
                 "sku": str(product.get("sku", "")),
                 "unit_cost": cost,
                 "unit_sale_price": sale_price,
                 "description": product.get("description", "") or f"Product SKU: {product.get('sku')}"
-            }
-            processed_products.append(processed_product)
-        
+            })
         product_data = processed_products
-
-    created_products = []
+    
+    products = []
     for product_info in product_data:
         try:
-            # Check if product already exists
-            existing = crud.get_product_by_sku(db, product_info.get("sku", ""))
-            if not existing:
-                product = schemas.ProductCreate(**product_info)
-                db_product = crud.create_product(db, product)
-                db.commit()  # Commit each successful creation
-                created_products.append(db_product)
-                print(f"Created product: {db_product.name}")
+            products.append(schemas.ProductCreate(**product_info))
         except Exception as e:
-            print(f"Error creating product {product_info.get('name', 'Unknown')}: {e}")
-            db.rollback()  # Rollback on error to reset transaction state
-    
-    return created_products
+            print(f"Skipping product {product_info.get('name', 'Unknown')}: {e}")
+    return products
 
-async def seed_tenders(db: Session):
-    """Seed tenders from sample endpoint with proper field mapping"""
-    print("Fetching tender samples...")
-    tender_data = await fetch_sample_data(TENDER_SAMPLE_URL)
-    
+def prepare_tenders(tender_data) -> List[schemas.TenderCreate]:
+    """Map the tender feed to our schema, falling back to sample tenders"""
     if not tender_data:
         # Fallback sample tenders
-        sample_tenders = [
+        tender_data = [
             {
                 "client": "Ministry of Education",
                 "description": "Office furniture procurement"
@@ -115,7 +167,6 @@ async def seed_tenders(db: Session):
                 "description": "Municipal office setup"
             }
         ]
-        tender_data = sample_tenders
     else:
         # Process API data to match our schema
         processed_tenders = []
@@ -123,72 +174,43 @@ async def seed_tenders(db: Session):
             if not tender.get("client"):
                 print(f"Skipping tender with missing client: {tender}")
                 continue
-                
-            processed_tender = {
+            
+            processed_tenders.append({
                 "client": tender.get("client", ""),
                 "description": f"Tender {tender.get('id', '')} - Created: {tender.get('creation_date', '')}"
-            }
-            processed_tenders.append(processed_tender)
-        
+            })
         tender_data = processed_tenders
-
-    created_tenders = []
+    
+    tenders = []
     for tender_info in tender_data:
         try:
-            tender = schemas.TenderCreate(**tender_info)
-            db_tender = crud.create_tender(db, tender)
-            db.commit()  # Commit each successful creation
-            created_tenders.append(db_tender)
-            print(f"Created tender: {db_tender.client}")
+            tenders.append(schemas.TenderCreate(**tender_info))
         except Exception as e:
-            print(f"Error creating tender {tender_info.get('client', 'Unknown')}: {e}")
-            db.rollback()  # Rollback on error to reset transaction state
-    
-    return created_tenders
+            print(f"Skipping tender {tender_info.get('client', 'Unknown')}: {e}")
+    return tenders
 
-async def seed_orders(db: Session, tenders: List, products: List):
-    """Seed orders from sample endpoint with proper ID mapping"""
-    print("Fetching order samples...")
-    order_data = await fetch_sample_data(ORDER_SAMPLE_URL)
+def prepare_orders(order_data, tender_ids: List[int], product_ids: List[int]) -> List[schemas.OrderCreate]:
+    """Map the order feed onto existing tenders and products, or generate orders for every tender"""
+    random.seed(42)  # For reproducible results
     
-    if not order_data or not tenders or not products:
+    if not order_data:
         print("Using fallback order data - creating orders for all tenders")
-        sample_orders = []
-        
-        # Create orders for ALL tenders, not just first 3
-        import random
-        random.seed(42)  # For reproducible results
-        
-        for tender in tenders:
+        order_data = []
+        for tender_id in tender_ids:
             # Each tender gets 1-3 random products
-            num_products = random.randint(1, min(3, len(products)))
-            selected_products = random.sample(products, num_products)
-            
-            for product in selected_products:
-                quantity = random.randint(5, 50)  # Random quantity between 5-50
-                sample_orders.append({
-                    "tender_id": tender.id,
-                    "product_id": product.id,
-                    "awarded_quantity": quantity
+            num_products = random.randint(1, min(3, len(product_ids)))
+            for product_id in random.sample(product_ids, num_products):
+                order_data.append({
+                    "tender_id": tender_id,
+                    "product_id": product_id,
+                    "awarded_quantity": random.randint(5, 50)  # Random quantity between 5-50
                 })
-        
-        order_data = sample_orders
-        print(f"Generated {len(order_data)} orders for {len(tenders)} tenders")
+        print(f"Generated {len(order_data)} orders for {len(tender_ids)} tenders")
     else:
-        # Try to use API data and map to our database IDs
+        # Since API data might have different ID schemes, we'll distribute randomly
         print(f"Processing {len(order_data)} orders from API...")
         processed_orders = []
-        
-        # Create a mapping of available tender and product IDs
-        tender_ids = [t.id for t in tenders]
-        product_ids = [p.id for p in products]
-        
-        import random
-        random.seed(42)  # For reproducible results
-        
-        # For each API order, try to map it to our database
         for api_order in order_data:
-            # Since API data might have different ID schemes, we'll distribute randomly
             tender_id = random.choice(tender_ids)
             product_id = random.choice(product_ids)
             quantity = api_order.get("awarded_quantity", random.randint(5, 50))
@@ -197,7 +219,7 @@ async def seed_orders(db: Session, tenders: List, products: List):
             if isinstance(quantity, str):
                 try:
                     quantity = int(float(quantity))
-                except:
+                except ValueError:
                     quantity = random.randint(5, 50)
             
             if quantity <= 0:
@@ -208,104 +230,161 @@ async def seed_orders(db: Session, tenders: List, products: List):
                 "product_id": product_id,
                 "awarded_quantity": quantity
             })
-        
         order_data = processed_orders
         print(f"Processed {len(order_data)} orders from API data")
-
-    created_orders = []
+    
+    orders = []
     for order_info in order_data:
         try:
-            # Validate that the tender and product exist
-            tender_id = order_info.get("tender_id")
-            product_id = order_info.get("product_id")
-            
-            if tender_id and product_id and order_info.get("awarded_quantity", 0) > 0:
-                order = schemas.OrderCreate(**order_info)
-                db_order = crud.create_order(db, order)
-                db.commit()  # Commit each successful creation
-                created_orders.append(db_order)
-                if len(created_orders) % 10 == 0:  # Progress indicator
-                    print(f"Created {len(created_orders)} orders...")
+            orders.append(schemas.OrderCreate(**order_info))
         except Exception as e:
-            print(f"Error creating order: {e}")
-            db.rollback()  # Rollback on error to reset transaction state
+            print(f"Skipping order {order_info}: {e}")
+    return orders
+
+def seeding_plan(db: Session) -> dict:
+    """Which entity types need seeding; seeding only fills empty tables, so it is idempotent"""
+    plan = {
+        "products": not crud.rows_exist(db, Product),
+        "tenders": not crud.rows_exist(db, Tender),
+        "orders": not crud.rows_exist(db, Order),
+        "clear_orders": False,
+    }
+    if not plan["orders"]:
+        # Check if we have significantly fewer orders than we should
+        total_orders = crud.count_orders(db)
+        expected_orders = min(crud.count_tenders(db), 100) * 2  # Rough estimate: 2 orders per tender on average
+        if total_orders < expected_orders * 0.5:  # If we have less than 50% of expected orders
+            print(f"Only {total_orders} orders exist, expected ~{expected_orders}. Recreating orders...")
+            plan["orders"] = plan["clear_orders"] = True
+        else:
+            print(f"Sufficient orders exist ({total_orders}). Skipping order seeding.")
+    return plan
+
+def write_samples(db: Session, plan: dict, feeds: dict) -> dict:
+    """Insert the prepared samples in batches, one transaction per entity type"""
+    counts = {"products": 0, "tenders": 0, "orders": 0}
+    
+    _set_status(step="products")
+    if plan["products"]:
+        inserted, _ = crud.upsert_products_bulk(db, prepare_products(feeds.get(PRODUCT_SAMPLE_URL)))
+        counts["products"] = inserted
+    else:
+        print("Products already exist. Skipping product seeding.")
     
-    print(f"Successfully created {len(created_orders)} orders")
-    return created_orders
+    _set_status(step="tenders")
+    if plan["tenders"]:
+        counts["tenders"] = len(crud.create_tenders_bulk(db, prepare_tenders(feeds.get(TENDER_SAMPLE_URL))))
+    else:
+        print("Tenders already exist. Skipping tender seeding.")
+    
+    _set_status(step="orders")
+    if plan["orders"]:
+        tender_ids = [tender_id for (tender_id,) in db.query(Tender.id).order_by(Tender.id)]
+        product_ids = [product_id for (product_id,) in db.query(Product.id).order_by(Product.id)]
+        if not tender_ids or not product_ids:
+            print("Cannot seed orders: missing tenders or products.")
+        else:
+            orders = prepare_orders(feeds.get(ORDER_SAMPLE_URL), tender_ids, product_ids)
+            if plan["clear_orders"]:
+                db.query(Order).delete()
+                print("Cleared existing orders")
+            # The delete and the new orders commit together
+            created, errors = crud.create_orders_bulk(db, orders)
+            if plan["clear_orders"]:
+                db.commit()
+                rollups.rebuild_all(db)
+            for error in errors:
+                print(f"Error creating order {error.index}: {error.detail}")
+            counts["orders"] = len(created)
+    
+    # Materialize the margin rollups for data created before they existed
+    _set_status(step="rollups")
+    if db.query(TenderMargin).count() != db.query(Tender).count():
+        print("Rebuilding tender margin rollup...")
+        rollups.rebuild_tender_margins(db)
+    if db.query(Order).first() is not None and db.query(DailyMargin).first() is None:
+        print("Rebuilding daily margin rollup...")
+        rollups.rebuild_daily_margins(db)
+    return counts
+
+async def _run_db_step(fn, *args):
+    """Run a database step in the threadpool, holding back cancellation until it is done
+
+    Cancelling the await does not stop the worker thread, so without this the
+    caller would close the session while the thread is still using it.
+    """
+    step = asyncio.ensure_future(run_in_threadpool(fn, *args))
+    try:
+        return await asyncio.shield(step)
+    except asyncio.CancelledError:
+        while not step.done():
+            try:
+                await asyncio.wait([step])
+            except asyncio.CancelledError:
+                pass
+        raise
 
 async def seed_database():
     """Seed the entire database with sample data"""
     print("Starting database seeding...")
+    _set_status(state="waiting", step="lock", started_at=datetime.now(timezone.utc),
+                finished_at=None, error=None, created=None)
     
-    # Create tables
-    Base.metadata.create_all(bind=engine)
-    
-    # Get database session
-    db = next(get_db())
-    
-    try:
-        # Check and seed each entity type separately
-        products = []
-        tenders = []
-        orders = []
-        
-        # Seed products if none exist
-        existing_products = crud.get_products(db, limit=1)
-        if not existing_products:
-            print("Seeding products...")
-            products = await seed_products(db)
-        else:
-            print("Products already exist. Skipping product seeding.")
-            products = crud.get_products(db, limit=100)  # Get existing products
-        
-        # Seed tenders if none exist
-        existing_tenders = crud.get_tenders(db, limit=1)
-        if not existing_tenders:
-            print("Seeding tenders...")
-            tenders = await seed_tenders(db)
-        else:
-            print("Tenders already exist. Skipping tender seeding.")
-            tenders = crud.get_tenders(db, limit=100)  # Get existing tenders
+    async with seed_lock():
+        _set_status(state="running", step="planning")
+        # A session of our own: the generator behind get_db() would close it
+        # as soon as it is garbage collected
+        db = SessionLocal()
         
-        # Seed orders - create comprehensive order dataset
-        existing_orders = crud.get_orders(db, limit=1)
-        if not existing_orders and tenders and products:
-            print("Seeding orders for all tenders...")
-            orders = await seed_orders(db, tenders, products)
-        else:
-            if existing_orders:
-                print("Orders already exist. Checking if we need to create more...")
-                # Check if we have significantly fewer orders than we should
-                total_orders = len(crud.get_orders(db, limit=1000))
-                expected_orders = len(tenders) * 2  # Rough estimate: 2 orders per tender on average
-                
-                if total_orders < expected_orders * 0.5:  # If we have less than 50% of expected orders
-                    print(f"Only {total_orders} orders exist, expected ~{expected_orders}. Creating more orders...")
-                    # Clear existing orders and recreate with full dataset
-                    try:
-                        # Delete existing orders using ORM
-                        from database import Order
-                        db.query(Order).delete()
-                        db.commit()
-                        print("Cleared existing orders")
-                        orders = await seed_orders(db, tenders, products)
-                    except Exception as e:
-                        print(f"Error clearing orders: {e}")
-                        db.rollback()
-                        orders = []
-                else:
-                    print(f"Sufficient orders exist ({total_orders}). Skipping order seeding.")
-                    orders = []
-            else:
-                print("Cannot seed orders: missing tenders or products.")
-                orders = []
-        print(f"Seeding completed: {len(products)} products, {len(tenders)} tenders, {len(orders)} orders")
-        
-    except Exception as e:
-        print(f"Error during seeding: {e}")
-        db.rollback()
-    finally:
-        db.close()
+        try:
+            # Database work runs in the threadpool so requests keep being served
+            plan = await _run_db_step(seeding_plan, db)
+            
+            # Fetch only the feeds that will be used, all at once
+            urls = [
+                url for url, needed in [
+                    (PRODUCT_SAMPLE_URL, plan["products"]),
+                    (TENDER_SAMPLE_URL, plan["tenders"]),
+                    (ORDER_SAMPLE_URL, plan["orders"]),
+                ] if needed
+            ]
+            _set_status(step="fetching")
+            print(f"Fetching {len(urls)} sample feeds...")
+            feeds = await fetch_samples(urls)
+            
+            counts = await _run_db_step(write_samples, db, plan, feeds)
+            print(f"Seeding completed: {counts['products']} products, {counts['tenders']} tenders, {counts['orders']} orders")
+            _set_status(state="completed", step=None, created=counts)
+            
+        except asyncio.CancelledError:
+            _set_status(state="cancelled")
+            raise
+        except Exception as e:
+            print(f"Error during seeding: {e}")
+            _set_status(state="failed", error=str(e))
+            db.rollback()
+        finally:
+            db.close()
+            _set_status(finished_at=datetime.now(timezone.utc))
+
+_seed_task = None
+
+def start_background_seeding():
+    """Seed in a background task so startup does not wait for it"""
+    global _seed_task
+    if _seed_task is None or _seed_task.done():
+        _seed_task = asyncio.get_running_loop().create_task(seed_database())
+    return _seed_task
+
+async def stop_background_seeding():
+    if _seed_task is not None and not _seed_task.done():
+        _seed_task.cancel()
+        try:
+            await _seed_task
+        except asyncio.CancelledError:
+            pass
 
 if __name__ == "__main__":
+    from database import init_db
+    init_db()
     asyncio.run(seed_database())
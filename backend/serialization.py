@@ -0,0 +1,34 @@
+"""Fast JSON responses for the list and detail endpoints.
+
+These endpoints build plain dicts straight from row tuples and serialize them
+with orjson, instead of building Pydantic models that FastAPI then validates
+again against the endpoint's response_model. The dicts carry exactly the
+response_model fields in the same order, so the JSON does not change.
+"""
+from decimal import Decimal
+from typing import Any, List, Type
+import orjson
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+def schema_fields(schema: Type[BaseModel]) -> List[str]:
+    """Field names of a response schema in serialization order"""
+    return list(schema.__fields__)
+
+def _default(value):
+    # Money columns read as Decimal; the API has always returned JSON numbers
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+class MoneyJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also serializes Decimal amounts"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+def json_response(response: Response, content) -> ORJSONResponse:
+    """Serialize content with orjson, keeping the headers already set on response"""
+    # A returned Response bypasses response_model and the injected response's headers
+    return MoneyJSONResponse(content, headers=dict(response.headers))
@@ -69,6 +69,11 @@ export const tenderApi = {
     return response.data;
   },
 
+  getTendersDetails: async (ids: number[]): Promise<Record<number, TenderWithDetails>> => {
+    const response = await api.get('/tenders/details', { params: { ids: ids.join(',') } });
+    return response.data;
+  },
+
   createTender: async (tender: TenderForm): Promise<Tender> => {
     const response = await api.post('/tenders/', tender);
     return response.data;